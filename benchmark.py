@@ -0,0 +1,95 @@
+import asyncio, logging, sys, os, json, time, shutil, tempfile, yaml
+import run
+from src.fake_github import FakeGitHub
+from src.synthetic_repo import SyntheticRepo
+
+OWNER_LOGIN = 'gitgoat-owner'
+OWNER_TOKEN = 'ghp_gitgoat_benchmark_owner'
+
+# Runs GitGoat end to end against a local fake GitHub, so the effect of a change on the whole run can be measured without a real organization.
+def benchmark(config_file, latency = 0, error_rate = 0, rate_limit = None, concurrency = 10, parallel_orgs = 1, orgs = 1, history = 200, keep = False):
+    with open(config_file, 'r') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix='gitgoat-benchmark-')
+    users = {OWNER_TOKEN: OWNER_LOGIN}
+    for member in config['members']:
+        users[run.get_member_token(member)] = member['login']
+        users[member['member_id']] = member['login']
+    fake = FakeGitHub(os.path.join(workspace, 'github'), latency, error_rate, rate_limit, users=users, seed=0)
+    try:
+        seed_public_repos(fake, config, history)
+        config['base_url'] = fake.api_url
+        config['public_repos_url'] = fake.url
+        config['is_saas'] = True
+        config['org_names'] = [f'GitGoat-Benchmark-{i}' for i in range(orgs)]
+        benchmark_config_file = os.path.join(workspace, 'config.yaml')
+        with open(benchmark_config_file, 'w') as f:
+            yaml.dump(config, f)
+        if os.path.isdir(os.path.join(cwd, 'secrets')):
+            os.symlink(os.path.join(cwd, 'secrets'), os.path.join(workspace, 'secrets'))
+        os.environ['github_token'] = OWNER_TOKEN
+        os.chdir(workspace)
+        fake.start()
+        start = time.monotonic()
+        failed_orgs = asyncio.run(run.mock(config_file=benchmark_config_file, concurrency=concurrency, parallel_orgs=parallel_orgs))
+        wall_time = time.monotonic() - start
+        return get_report(fake, wall_time, failed_orgs, {'latency': latency, 'error_rate': error_rate, 'rate_limit': rate_limit, 'concurrency': concurrency, 'parallel_orgs': parallel_orgs, 'orgs': orgs, 'history': history})
+    finally:
+        fake.stop()
+        os.chdir(cwd)
+        if keep:
+            logging.info(f'The benchmark workspace is kept in {workspace}')
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+# Every mapped public repo gets a synthetic history with more contributors than the members mapped to it.
+def seed_public_repos(fake, config, history):
+    for position, repo in enumerate(config['repo_names_mapping_to_public_repos']):
+        public_repo = config['repo_names_mapping_to_public_repos'][repo]
+        authors = [f'contributor{i}@{public_repo["org"].lower()}.example.com' for i in range(15)]
+        SyntheticRepo.create(fake.get_repo_path(public_repo['org'], public_repo['repo']), authors, commits=history, files=20, merge_rate=0.05, seed=position)
+        fake.add_repo(public_repo['org'], public_repo['repo'])
+
+def get_report(fake, wall_time, failed_orgs, settings):
+    stats = fake.get_stats()
+    api_requests = sum(stats[route]['count'] for route in stats if ' git ' not in route)
+    git_requests = sum(stats[route]['count'] for route in stats if ' git ' in route)
+    status = {}
+    for route in stats:
+        for code in stats[route]['status']:
+            status[code] = status.get(code, 0) + stats[route]['status'][code]
+    return {
+        'settings': settings,
+        'wall_time': round(wall_time, 3),
+        'failed_orgs': failed_orgs,
+        'api_requests': api_requests,
+        'git_requests': git_requests,
+        'requests_per_second': round((api_requests + git_requests) / wall_time, 2) if wall_time > 0 else None,
+        'status': status,
+        'routes': stats
+    }
+
+def print_report(report):
+    print(f'Wall time: {report["wall_time"]} seconds')
+    print(f'Failed organizations: {", ".join(report["failed_orgs"]) if len(report["failed_orgs"]) > 0 else "none"}')
+    print(f'API requests: {report["api_requests"]}, git requests: {report["git_requests"]}, {report["requests_per_second"]} requests per second')
+    print(f'Status codes: {", ".join(f"{code}: {count}" for code, count in sorted(report["status"].items()))}')
+    for route in sorted(report['routes'], key=lambda route: -report['routes'][route]['count']):
+        print(f'{report["routes"][route]["count"]:>8}  {route}')
+
+if __name__ == '__main__':
+    config_file = run.get_cli_argument('--config', 'config.yaml')
+    latency = float(run.get_cli_argument('--latency', 0))
+    error_rate = float(run.get_cli_argument('--error-rate', 0))
+    rate_limit = run.get_cli_argument('--rate-limit')
+    concurrency = int(run.get_cli_argument('--concurrency', 10))
+    parallel_orgs = int(run.get_cli_argument('--parallel-orgs', 1))
+    orgs = int(run.get_cli_argument('--orgs', 1))
+    history = int(run.get_cli_argument('--history', 200))
+    output = run.get_cli_argument('--output')
+    report = benchmark(config_file, latency, error_rate, int(rate_limit) if rate_limit is not None else None, concurrency, parallel_orgs, orgs, history, '--keep' in sys.argv)
+    print_report(report)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
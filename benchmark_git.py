@@ -0,0 +1,97 @@
+import asyncio, logging, sys, os, json, time, shutil, tempfile, statistics, platform, subprocess, pygit2
+import run
+from datetime import datetime
+from src.public_repo_map import IdentityMap
+from src.repository import Repository
+from src.synthetic_repo import SyntheticRepo
+
+MAPPED_AUTHORS = 5
+
+# Times the local git work of GitGoat on synthetic public repos of every size. Every case appends one JSON line to the output file,
+# with the settings and versions needed to compare it with other runs.
+def benchmark(sizes, authors = 50, files = 1000, churn = 3, merge_rate = 0.1, repeat = 3, output = None, keep = False):
+    workspace = tempfile.mkdtemp(prefix='gitgoat-git-benchmark-')
+    results = []
+    try:
+        for commits in sizes:
+            settings = {'commits': commits, 'authors': authors, 'files': files, 'churn': churn, 'merge_rate': merge_rate}
+            repo_path = os.path.join(workspace, f'public-{commits}.git')
+            emails = [f'contributor{i}@example.com' for i in range(authors)]
+            started = time.monotonic()
+            SyntheticRepo.create(repo_path, emails, commits, files=files, churn=churn, merge_rate=merge_rate)
+            logging.info(f'Generated a repo with {commits} commits in {time.monotonic() - started:.1f} seconds')
+            for case, func in get_cases(workspace, repo_path, emails):
+                timings = measure(func, repeat)
+                result = {**get_environment(), 'case': case, **settings, 'repeat': repeat, 'min': min(timings), 'median': statistics.median(timings), 'timings': timings}
+                logging.info(f'{case} on {commits} commits: median {result["median"]:.3f} seconds, min {result["min"]:.3f} seconds')
+                results.append(result)
+                if output is not None:
+                    with open(output, 'a') as f:
+                        f.write(json.dumps(result, sort_keys=True) + '\n')
+    finally:
+        if keep:
+            logging.info(f'The benchmark workspace is kept in {workspace}')
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+# Every case is a pair of a setup function and a measured function, so resetting the repo between repeats is not timed.
+def get_cases(workspace, repo_path, emails):
+    mapped_authors = {emails[i]: f'member{i}@gitgoat.tools' for i in range(MAPPED_AUTHORS)}
+    email_to_login_map = {email: f'member{i}-gg' for i, email in enumerate(mapped_authors.values())}
+    last_commit_map = {email: 30 for email in mapped_authors.values()}
+    target_path = os.path.join(workspace, 'target.git')
+    def amend():
+        return Repository.amend_repo(pygit2.Repository(repo_path), mapped_authors, email_to_login_map, last_commit_map)
+    def reset_amend():
+        if os.path.exists(os.path.join(repo_path, Repository.REWRITE_STATE_FILE)):
+            os.remove(os.path.join(repo_path, Repository.REWRITE_STATE_FILE))
+    def reset_push():
+        shutil.rmtree(target_path, ignore_errors=True)
+        pygit2.init_repository(target_path, bare=True)
+    def push():
+        returncode, _, stderr = asyncio.run(Repository.run_git(repo_path, 'push', target_path, f'+{Repository.AMENDED_BRANCH}:main'))
+        if returncode != 0:
+            raise RuntimeError(stderr)
+    return [
+        ('count_authors', (None, lambda: IdentityMap.count_authors(repo_path, 0))),
+        ('walk_authors', (None, lambda: IdentityMap.walk_authors(pygit2.Repository(repo_path), 0))),
+        ('amend_repo', (reset_amend, amend)),
+        # The rewrite state of the previous case is kept, so nothing is left to rewrite.
+        ('amend_repo_incremental', (None, amend)),
+        ('push', (reset_push, push))
+    ]
+
+def measure(func, repeat):
+    setup, measured = func
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        measured()
+        timings.append(round(time.perf_counter() - started, 6))
+    return timings
+
+def get_environment():
+    revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    git_version = subprocess.run(['git', '--version'], capture_output=True, text=True)
+    return {
+        'time': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'revision': revision.stdout.strip(),
+        'python': platform.python_version(),
+        'pygit2': pygit2.__version__,
+        'git': git_version.stdout.strip().replace('git version ', ''),
+        'machine': platform.machine()
+    }
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', datefmt='%m/%d/%Y %H:%M:%S', level=logging.INFO)
+    sizes = [int(size) for size in run.get_cli_argument('--sizes', '1000,10000,100000').split(',')]
+    authors = int(run.get_cli_argument('--authors', 50))
+    files = int(run.get_cli_argument('--files', 1000))
+    churn = int(run.get_cli_argument('--churn', 3))
+    merge_rate = float(run.get_cli_argument('--merge-rate', 0.1))
+    repeat = int(run.get_cli_argument('--repeat', 3))
+    output = run.get_cli_argument('--output', 'benchmark_git.jsonl')
+    benchmark(sizes, authors, files, churn, merge_rate, repeat, output, '--keep' in sys.argv)
@@ -1,6 +1,7 @@
-import asyncio, logging, sys
-from tqdm import tqdm
+import asyncio, logging, sys, os
+from functools import partial
 from src.config import Config
+from src.connection import ConnectionHandler
 from src.repository import Repository
 from src.teams import Team
 from src.actions import Actions
@@ -10,212 +11,344 @@ from src.pull_request import PullRequest
 from src.branch import Branch
 from src.codeowners import CodeOwners
 from src.secrets import Secrets
+from src.scheduler import Scheduler
+from src.permissions import Permissions
+from src.executor import IdentityExecutor
+from src.journal import Journal
+from src.telemetry import Telemetry
+from src.planner import Planner
 
-async def mock(config_file: str, orgs: list = []):
+WORKSPACES_PATH = 'workspaces'
+
+# Returns the organizations that failed. A failing organization does not stop the others.
+# The requests and task durations of the run are written to a report in the reports directory.
+async def mock(config_file: str, orgs: list = [], concurrency: int = 10, parallel_orgs: int = 1, reconcile: bool = False, resume: bool = False, plan: bool = False):
+    telemetry = Telemetry.reset()
     secrets = Secrets()
-    config = Config() if config_file is None else Config(config_file)
+    config = Config.load(config_file)
     org_names = orgs if len(orgs) > 0 else config.org_names
-    for org in org_names:
+    semaphore = asyncio.Semaphore(concurrency)
+    org_slots = asyncio.Semaphore(parallel_orgs)
+    try:
+        results = await asyncio.gather(*[mock_org(config, org, secrets, semaphore, org_slots, position, parallel_orgs > 1, reconcile, resume, plan) for position, org in enumerate(org_names)], return_exceptions=True)
+    finally:
+        await ConnectionHandler.close()
+        telemetry.write_report('plan' if plan else 'run')
+    failed_orgs = []
+    for org, result in zip(org_names, results):
+        if isinstance(result, Exception):
+            logging.error(f'----- Organization {org} failed: {result} -----')
+            failed_orgs.append(org)
+        else:
+            logging.info(f'----- Organization {org} completed -----')
+    return failed_orgs
+
+# Organizations that run in parallel get their own workspace so their local clones never collide.
+# Every completed task is journaled. A resumed run skips them, and since no repo or member may be deleted it reconciles the rest.
+# A planned run is not journaled, so it never affects the resume of a real run.
+async def mock_org(config, org, secrets, semaphore, org_slots, position = 0, isolated = False, reconcile = False, resume = False, plan = False):
+    async with org_slots:
         logging.info(f'----- Organization: {org} -----')
-        logging.info('----- Creating Repos -----')
-        await create_repos(config, org)
-        logging.info('----- Setting up Actions configurations -----')
-        await setup_actions(config, org)
-        logging.info('----- Inviting Members -----')
-        await invite_members(config, org)
-        logging.info('----- Members accepting invitations -----')
-        await accept_invitations(config, org)
-        logging.info('----- Creating Teams -----')
-        await create_teams(config, org)
-        logging.info('----- Creating Commits and Pull Requests -----')
-        await create_commits(config, org, secrets)
-        logging.info('----- Reviewing Pull Requests -----')
-        await review_pull_requests(config, org)
-        logging.info('----- Merging Pull Requests -----')
-        await merge_pull_requests(config, org)
-        logging.info('----- Configuring CODEOWNERS -----')
-        await configure_codeowners(config, org)
-        logging.info('----- Configuring Branch Protection -----')
-        await configure_branch_protection(config, org)
-
-async def create_repos(config, org):
-    r = Repository(org, config.filename) 
-    await r.delete_existing_repos()
-    for repo_name in tqdm(config.repo_names, desc='Repos'):
-        if repo_name in config.repo_names_mapping_to_public_repos:
+        workspace = os.path.join(os.getcwd(), WORKSPACES_PATH, org) if isolated else None
+        journal = Journal(org, config.filename, resume) if not plan else None
+        try:
+            scheduler = await asyncio.to_thread(build_pipeline, config, org, secrets, workspace, position if isolated else 0, reconcile or resume, plan, journal)
+            await scheduler.run(semaphore=semaphore, journal=journal)
+        finally:
+            if journal is not None:
+                journal.close()
+
+# Every unit of work waits only for the units it really depends on, so independent repos and members progress concurrently.
+# With reconcile, no repo or member is deleted. The current state of the organization is read instead, and only the differences from the config file are applied.
+# Teams, team members and team repo permissions that the config file no longer lists are removed.
+# With plan, git is not run and the public repos are replaced by repos with a single commit.
+def build_pipeline(config, org, secrets, workspace = None, position = 0, reconcile = False, plan = False, journal = None):
+    s = Scheduler(org, position)
+    r = Repository(org, config, workspace)
+    t = Team(org, config)
+    m = Membership(org, config)
+    a = Actions(org, config)
+    pr = PullRequest(org, config)
+    b = Branch(org, config)
+    permissions = Permissions(config)
+    org_members = set()
+    teams = {}
+    existing_teams = {}
+    existing_branches = {}
+    if reconcile:
+        repos_ready = s.add('read-repos', partial(read_repos, r, existing_branches, journal), journaled=False)
+        teams_ready = s.add('read-teams', partial(read_teams, t, existing_teams, teams), journaled=False)
+        invitations_ready = s.add('read-invitations', partial(read_invitations, m, org_members), journaled=False)
+    else:
+        # Every repo is deleted, so no branch existed before the run.
+        if journal is not None:
+            journal.set_state('existing_branches', {})
+        repos_ready = s.add('delete-repos', r.delete_existing_repos)
+        teams_ready = s.add('delete-teams', t.delete)
+        invitations_ready = s.add('cancel-invitations', partial(cancel_invitations, m, org_members))
+    for repo_name in config.repo_names:
+        s.add(f'repo:{repo_name}', partial(create_repo, config, r, repo_name, reconcile, plan), [repos_ready])
+    s.add('actions', partial(setup_actions, config, a, r, reconcile), [f'repo:{repo_name}' for repo_name in config.repo_names])
+    for repo_name in get_actions_enabled_repo_names(config):
+        s.add(f'actions:{repo_name}', partial(setup_repo_actions, config, a, repo_name, reconcile), ['actions'])
+    for member in config.members:
+        s.add(f'invite:{member["login"]}', partial(m.invite_member, member, org_members), [invitations_ready])
+        s.add(f'accept:{member["login"]}', partial(m.accept_invitation_to_org, get_member_token(member), reconcile), [f'invite:{member["login"]}'])
+    team_member_tasks = {member['login']: [] for member in config.members}
+    # Sibling teams are created concurrently as soon as their parent exists. The members of a team are added together once they joined the organization.
+    definitions = Team.get_definitions(config, org)
+    for team in definitions:
+        dependencies = [teams_ready] + [f'repo:{repo_name}' for repo_name in team['permissions']]
+        if team['parent'] is not None:
+            dependencies.append(f'team:{team["parent"]}')
+        s.add(f'team:{team["name"]}', partial(create_team, t, team, teams, existing_teams), dependencies)
+        if len(team['members']) == 0 and not reconcile:
+            continue
+        task_name = s.add(f'team-members:{team["name"]}', partial(add_team_members, t, teams, team, existing_teams), [f'team:{team["name"]}'] + [f'accept:{login}' for login in team['members']])
+        for login in team['members']:
+            team_member_tasks[login].append(task_name)
+    if reconcile:
+        s.add('remove-teams', partial(remove_teams, t, definitions, existing_teams), [f'team:{team["name"]}' for team in definitions])
+    all_team_member_tasks = list(dict.fromkeys(task for login in team_member_tasks for task in team_member_tasks[login]))
+    commit_tasks = {repo_name: [] for repo_name in config.repo_names}
+    branch_tasks = {}
+    for member in config.members:
+        if len(member['days_since_last_commit']) == 0:
+            continue
+        # All the branches of a member are committed to by one task, so their commits can share batched mutations.
+        dependencies = [f'accept:{member["login"]}'] + team_member_tasks[member['login']]
+        for commit_details in member['days_since_last_commit']:
+            dependencies.append(f'repo:{commit_details["repo"]}')
+            # Commits to the same branch must not race on the branch head.
+            branch = (commit_details['repo'], commit_details['branch'])
+            if branch in branch_tasks:
+                dependencies.append(branch_tasks[branch])
+        task_name = s.add(f'commits:{member["login"]}', partial(create_commits, config, org, secrets, pr, member, existing_branches, journal), dependencies)
+        for commit_details in member['days_since_last_commit']:
+            branch_tasks[(commit_details['repo'], commit_details['branch'])] = task_name
+            commit_tasks.setdefault(commit_details['repo'], []).append(task_name)
+    for repo_name in config.repo_names:
+        s.add(f'review:{repo_name}', partial(review_pull_requests, config, permissions, pr, repo_name), commit_tasks[repo_name] + all_team_member_tasks)
+        s.add(f'merge:{repo_name}', partial(merge_pull_requests, config, permissions, pr, repo_name), [f'review:{repo_name}'])
+        s.add(f'codeowners:{repo_name}', partial(configure_codeowners, config, org, repo_name, reconcile), [f'merge:{repo_name}'])
+        s.add(f'branch-protection:{repo_name}', partial(configure_branch_protection, permissions, b, repo_name, reconcile), [f'codeowners:{repo_name}'])
+    return s
+
+def get_member_token(member):
+    return member['token'] if 'ghp_' in member['token'] else 'ghp_' + member['token']
+
+# The branches of the existing repos are recorded before any repo is created or pushed to, so the commit phase only seeds the missing ones.
+# The branches are saved in the journal by the first run. A resumed run uses them, since the branches the first run created are not done until their commit tasks are.
+async def read_repos(r, existing_branches, journal = None):
+    branches = journal.get_state('existing_branches') if journal is not None else None
+    if branches is None:
+        branches = {}
+        for repo_name in await r.inventory.get_repo_names():
+            branches[repo_name] = sorted((await r.inventory.get_repo(repo_name))['branches'])
+        if journal is not None:
+            journal.set_state('existing_branches', branches)
+    for repo_name in branches:
+        existing_branches[repo_name] = set(branches[repo_name])
+
+# An existing repo is kept with reconcile. The rewritten history of a public repo is only pushed if the repo does not have the branch yet, or the branch was not changed since the last push.
+async def create_repo(config, r, repo_name, reconcile = False, plan = False):
+    exists = reconcile and await r.inventory.get_repo(repo_name) is not None
+    if repo_name in config.repo_names_mapping_to_public_repos and not plan:
+        if not exists:
             await r.create(repo_name, auto_init = False)
-            await r.clone_public_repo(config.repo_names_mapping_to_public_repos[repo_name]['org'], config.repo_names_mapping_to_public_repos[repo_name]['repo'])
-            logging.debug(f'Cloned {config.repo_names_mapping_to_public_repos[repo_name]["repo"]} to org {org} and repo {repo_name}.')
-        else:
-            await r.create(repo_name, auto_init = True)
-            logging.debug(f'Created {repo_name} in org {org}.')
-    
-async def create_teams(config, org):
-    t = Team(org, config.filename)
-    await t.delete()
-    parent_team_slug_map = {}
-    for parent_repo in tqdm(config.parent_teams, desc='Parent Teams'):
-        repos = [f'{org}/{repo}-{parent_repo["repo_permissions"][repo]}' for repo in parent_repo['repo_permissions']]
-        team_slug, team_id = await t.create(parent_repo['team'], repos)
-        parent_team_slug_map[parent_repo['team']] = team_id
-        for repo in parent_repo['repo_permissions']:
-            await t.add_repository_permission(team_slug, f'{org}/{repo}', parent_repo['repo_permissions'][repo])
-        for member in config.members:
-            if (parent_repo in member['member_of_groups']):
-                await t.add_member(team_slug,member['login'])
-    for repo in tqdm(config.teams, desc='Teams'):
-        for gp in repo['group_postfixes']:
-            parent = None
-            for parent_repo in config.parent_teams:
-                if f'{repo["repo"]}-{gp}' in parent_repo['children']:
-                    parent = parent_team_slug_map[parent_repo["team"]]
-            team_slug, _ = await t.create(f'{repo["repo"]}-{gp}', [f'{org}/{repo["repo"]}'], parent)
-            await t.add_repository_permission(team_slug, f'{org}/{repo["repo"]}', gp)
-            for member in config.members:
-                if (f'{repo["repo"]}-{gp}' in member['member_of_groups']):
-                    await t.add_member(team_slug,member['login'])
-
-async def invite_members(config, org):
-    m = Membership(org, config.filename)
-    await m.invite_members()
-
-async def accept_invitations(config, org):
-    m = Membership(org, config.filename)
-    for member in tqdm(config.members, desc='Members'):
-        token =  member['token'] if 'ghp_' in member['token'] else 'ghp_' + member['token']
-        await m.accept_invitation_to_org(token)
-
-async def setup_actions(config, org):
-    a = Actions(org, config.filename)
-    await a.enable_selected_repositories_in_org()
-    r = Repository(org, config.filename)
-    repo_mapping = {}
-    for repo in await r.get_all():
-        repo_mapping[repo['name']] = repo['id']
-    actions_enabled_repo_ids = []
+        await r.clone_public_repo(config.repo_names_mapping_to_public_repos[repo_name]['org'], config.repo_names_mapping_to_public_repos[repo_name]['repo'], reconcile = reconcile)
+        logging.debug(f'Cloned {config.repo_names_mapping_to_public_repos[repo_name]["repo"]} to org {r.org} and repo {repo_name}.')
+    elif not exists:
+        await r.create(repo_name, auto_init = True)
+        logging.debug(f'Created {repo_name} in org {r.org}.')
+
+async def create_team(t, team, teams, existing_teams):
+    parent_team_id = teams[team['parent']]['id'] if team['parent'] is not None else None
+    if team['name'] in existing_teams:
+        team_slug, team_id = await t.reconcile(team, existing_teams[team['name']], parent_team_id)
+    else:
+        team_slug, team_id = await t.provision(team, parent_team_id)
+    teams[team['name']] = {'slug': team_slug, 'id': team_id}
+
+# Only the missing members are added to a team that already existed, and its members that the config file does not list are removed.
+# Maintainers are kept, e.g. the owner who created the team.
+async def add_team_members(t, teams, team, existing_teams):
+    members = team['members']
+    if team['name'] in existing_teams:
+        current_members = await t.get_direct_members(teams[team['name']]['slug'])
+        members = [login for login in members if login not in current_members]
+        await t.remove_members(teams[team['name']]['slug'], [login for login in current_members if current_members[login] == 'MEMBER' and login not in team['members']])
+    await t.add_members(teams[team['name']]['slug'], members)
+
+# The teams that are not in the config file are deleted after the others were moved under their parents, so none of them is deleted with its old parent.
+async def remove_teams(t, definitions, existing_teams):
+    names = set(team['name'] for team in definitions)
+    extra_team_ids = set(existing_teams[name]['id'] for name in existing_teams if name not in names)
+    await t.delete_teams([existing_teams[name]['slug'] for name in existing_teams if name not in names and existing_teams[name]['parent_id'] not in extra_team_ids])
+
+async def cancel_invitations(m, org_members):
+    org_members.update(await m.get_member_logins())
+    await m.cancel_invitations()
+
+# The existing teams are also known to the tasks that depend on a team task skipped by a resumed run.
+async def read_teams(t, existing_teams, teams):
+    existing_teams.update(await t.get_existing())
+    for name in existing_teams:
+        teams[name] = {'slug': existing_teams[name]['slug'], 'id': existing_teams[name]['id']}
+
+# Members and pending invitees are not invited again.
+async def read_invitations(m, org_members):
+    org_members.update(await m.get_member_logins())
+    org_members.update(await m.get_invitation_logins())
+
+def get_actions_enabled_repo_names(config):
     actions_enabled_repo_names = []
     for repo_name in config.repo_configs:
         if 'actions_enabled' in config.repo_configs[repo_name]:
             if config.repo_configs[repo_name]['actions_enabled']:
-                actions_enabled_repo_ids.append(repo_mapping[repo_name])
                 actions_enabled_repo_names.append(repo_name)
-    await a.enable_selected_repository_ids_in_org(actions_enabled_repo_ids)
-    for actions_enabled_repo in tqdm(actions_enabled_repo_names, desc='Actions'):
-        await a.enable_actions_in_repo(actions_enabled_repo, allowed_actions=config.repo_configs[actions_enabled_repo]['allowed_actions'])
-        if config.repo_configs[actions_enabled_repo]['allowed_actions'] == 'selected':
-            await a.enable_selected_actions_in_repo(actions_enabled_repo, verified_allowed=config.repo_configs[actions_enabled_repo]['verified_allowed_actions'])
-
-async def configure_codeowners(config, org):
-    for repo_name in tqdm(config.repo_names, desc='CODEOWNERS'):
-        co = CodeOwners(org,repo_name, config.filename)
-        await co.generate_codeowners()
-
-async def configure_branch_protection(config, org):
-    b = Branch(org, config.filename)
-    for repo_name in tqdm(config.repo_names, desc='Branch Protection'):
-        if 'branch_protection_restirctions' in config.repo_configs[repo_name]:
-            users = config.repo_configs[repo_name]['branch_protection_restirctions']['users']
-            teams = []
-            for team_postfix in config.repo_configs[repo_name]['branch_protection_restirctions']['teams']:
-                teams.append(f'{repo_name}-{team_postfix}')
-            enforce_admins = config.repo_configs[repo_name]['branch_protection_restirctions']['enforce_admins']
-            require_code_owner_reviews = config.repo_configs[repo_name]['branch_protection_restirctions']['require_code_owner_reviews']
-            await b.set_branch_protection(repo_name, 'main', enforce_admins, require_code_owner_reviews, users, teams)
-
-async def create_commits(config, org, secrets):
-    r = Repository(org, config.filename)
-    pr = PullRequest(org, config.filename)
+    return actions_enabled_repo_names
+
+async def setup_actions(config, a, r, reconcile = False):
+    if not reconcile or (await a.get_org_permissions()).get('enabled_repositories') != 'selected':
+        await a.enable_selected_repositories_in_org()
+    repo_ids = [await r.inventory.get_repo_id(repo_name) for repo_name in get_actions_enabled_repo_names(config)]
+    if not reconcile or await a.get_selected_repository_ids() != set(repo_ids):
+        await a.enable_selected_repository_ids_in_org(repo_ids)
+
+async def setup_repo_actions(config, a, repo_name, reconcile = False):
+    allowed_actions = config.repo_configs[repo_name]['allowed_actions']
+    current = await a.get_repo_permissions(repo_name) if reconcile else {}
+    if current.get('enabled') is not True or current.get('allowed_actions') != allowed_actions:
+        await a.enable_actions_in_repo(repo_name, allowed_actions=allowed_actions)
+    if allowed_actions == 'selected':
+        verified_allowed = config.repo_configs[repo_name]['verified_allowed_actions']
+        current = await a.get_selected_actions_in_repo(repo_name) if reconcile else {}
+        if current.get('github_owned_allowed') is not True or current.get('verified_allowed') != verified_allowed:
+            await a.enable_selected_actions_in_repo(repo_name, verified_allowed=verified_allowed)
+
+async def configure_codeowners(config, org, repo_name, reconcile = False):
+    co = CodeOwners(org, repo_name, config)
+    await co.generate_codeowners(reconcile)
+
+async def configure_branch_protection(permissions, b, repo_name, reconcile = False):
+    if repo_name in permissions.branch_protection:
+        protection = permissions.branch_protection[repo_name]
+        if reconcile and await b.is_branch_protection_current(repo_name, 'main', protection['enforce_admins'], protection['require_code_owner_reviews'], protection['users'], protection['teams']):
+            return
+        await b.set_branch_protection(repo_name, 'main', protection['enforce_admins'], protection['require_code_owner_reviews'], protection['users'], protection['teams'])
+
+# With reconcile, commits and pull requests are only generated for the branches that did not exist before the run.
+# Every completed chain of commits and every opened pull request is journaled, so a resumed task only does what a failed run did not.
+async def create_commits(config, org, secrets, pr, member, existing_branches = {}, journal = None):
+    token = get_member_token(member)
+    c = Commit(secrets, token, config)
+    activity = [d for d in member['days_since_last_commit'] if d['branch'] not in existing_branches.get(d['repo'], ())]
+    heads = {}
+    # A branch listed twice for the same member gets its second chain in a later wave, starting from the head left by the first.
+    waves = []
+    for commit_details in activity:
+        branch = (commit_details['repo'], commit_details['branch'])
+        wave = next((w for w in waves if branch not in [(d['repo'], d['branch']) for d in w]), None)
+        if wave is None:
+            wave = []
+            waves.append(wave)
+        wave.append(commit_details)
+    for position, wave in enumerate(waves):
+        wave = [d for d in wave if journal is None or not journal.is_completed(get_chain_name(member, d, position))]
+        if len(wave) == 0:
+            continue
+        missing = [(d['repo'], d['branch']) for d in wave if (d['repo'], d['branch']) not in heads]
+        for branch, sha in zip(missing, await asyncio.gather(*[c.get_branch_hash(org, repo, branch) for repo, branch in missing])):
+            heads[branch] = sha
+        branches = []
+        for commit_details in wave:
+            branches.append({
+                'organization': org,
+                'repository': commit_details['repo'],
+                'branch': commit_details['branch'],
+                'branch_head_hash': heads[(commit_details['repo'], commit_details['branch'])],
+                'days_since_latest_commit': commit_details['days'],
+                'commit_secret': 'commit_secrets_in_repositories' in member and commit_details['repo'] in member['commit_secrets_in_repositories']
+            })
+        results = await c.generate_random_commits_batch(branches, 15)
+        for commit_details, result in zip(wave, results):
+            heads[(commit_details['repo'], commit_details['branch'])] = result['head']
+            if journal is not None and result['error'] is None:
+                journal.record(get_chain_name(member, commit_details, position))
+    # A resumed task may have opened some of the pull requests already, and they may even be merged since.
+    for commit_details in activity:
+        if not commit_details['create_pr'] or commit_details['branch'] == 'main':
+            continue
+        name = get_pull_request_name(member, commit_details)
+        pull_requests = await pr.get_pull_requests(commit_details['repo'])
+        if (journal is not None and journal.is_completed(name)) or any(pull_requests[number]['head'] == commit_details['branch'] for number in pull_requests):
+            continue
+        if 'number' in await pr.create_pull_request(token, commit_details['repo'], commit_details['branch']) and journal is not None:
+            journal.record(name)
+
+def get_chain_name(member, commit_details, wave):
+    return f'commits:{member["login"]}:{commit_details["repo"]}/{commit_details["branch"]}#{wave}'
+
+def get_pull_request_name(member, commit_details):
+    return f'pull-request:{member["login"]}:{commit_details["repo"]}/{commit_details["branch"]}'
+
+# The open pull requests are read once from the organization inventory. Only the reviews themselves are sent to the API.
+# Every pull request is assigned to one reviewer up front, then the reviewers approve in parallel, each with their own PAT.
+async def review_pull_requests(config, permissions, pr, repo):
+    pull_requests = await pr.get_pull_requests(repo)
+    pr_reviews_map = {pr_id: pull_requests[pr_id]['review_decision'] == 'APPROVED' for pr_id in pull_requests}
+    assigned = set(pr_id for pr_id in pr_reviews_map if pr_reviews_map[pr_id])
+    executor = IdentityExecutor()
     for member in config.members:
-        token =  member['token'] if 'ghp_' in member['token'] else 'ghp_' + member['token']
-        for commit_details in tqdm(member['days_since_last_commit'], desc=f'Commits for {member["login"]}'):
-            c = Commit(secrets, token, config.filename)
-            sha = await c.get_branch_hash(org, commit_details['repo'], commit_details['branch'])
-            add_secret = False
-            if 'commit_secrets_in_repositories' in member and commit_details['repo'] in member['commit_secrets_in_repositories']:
-                add_secret = True
-            await c.generate_random_commits(org, commit_details['repo'], commit_details['branch'], sha, 15, commit_details['days'], add_secret)
-            if commit_details['create_pr'] and commit_details['branch'] != 'main':
-                await pr.create_pull_request(token, commit_details['repo'], commit_details['branch'])
-
-async def review_pull_requests(config, org):
-    pr = PullRequest(org, config.filename)
-    pr_reviews_map = await get_pr_reviews_map(pr, config)
-    for member in tqdm(config.members, desc=f'Members Review PRs'):
-        token =  member['token'] if 'ghp_' in member['token'] else 'ghp_' + member['token']
-        for repo in config.repo_names:
-            member_reviewed_prs_of_login = []
-            prs = await pr.get_pull_requests(token,repo)
-            if is_member_codeowner(config, member, repo):
-                for p in prs:
-                    if prs[p] != member['login'] and prs[p] not in member_reviewed_prs_of_login and not pr_reviews_map[repo][p]:
-                        await pr.review(token, repo, p)
-                        pr_reviews_map[repo][p] = True
-                        member_reviewed_prs_of_login.append(prs[p])
-            elif can_members_review(config, repo):
-                for p in prs:
-                    if prs[p] != member['login'] and not pr_reviews_map[repo][p]:
-                        await pr.review(token, repo, p)
-                        pr_reviews_map[repo][p] = True
-                        member_reviewed_prs_of_login.append(prs[p])
-    await review_pull_requests_by_owner(pr_reviews_map, pr)
-
-async def review_pull_requests_by_owner(pr_reviews_map, pr):
-    for repo in tqdm(pr_reviews_map, desc=f'Owner Reviews PRs'):
-        for pr_id in pr_reviews_map[repo]:
-            if not pr_reviews_map[repo][pr_id]:
-                await pr.review(Config.get_pat(), repo, pr_id)
-
-async def get_pr_reviews_map(pr, config):
-    pr_reviews_map = {}
-    for repo in config.repo_names:
-        pr_reviews_map[repo] = {}
-        for pr_id in await pr.get_pull_requests(Config.get_pat(),repo):
-            pr_reviews_map[repo][pr_id] = False
-    return pr_reviews_map
-
-async def merge_pull_requests(config, org):
-    pr = PullRequest(org, config.filename)
-    for member in tqdm(config.members, desc=f'Members Merge PRs'):
-        for repo in config.repo_names:
-            token =  member['token'] if 'ghp_' in member['token'] else 'ghp_' + member['token']
-            if is_member_allowed_to_merge(config, member, repo):
-                prs = await pr.get_pull_requests(token,repo)
-                for p in prs:
-                    merged = await pr.merge(token, repo, p)
-                    if not merged: 
-                        logging.warning(f'Did NOT merge the PR id {p} in repository {repo} by {member["login"]}')
-
-def can_members_review(config, repo):
-    if 'branch_protection_restirctions' in config.repo_configs[repo] and 'require_code_owner_reviews' in config.repo_configs[repo]['branch_protection_restirctions'] and not config.repo_configs[repo]['branch_protection_restirctions']['require_code_owner_reviews']:
-        return True
-    return False
-
-def is_member_codeowner(config, member, repo):
-    if 'codeowners' in config.repo_configs[repo] and 'owners' in config.repo_configs[repo]['codeowners']:
-        for owner in config.repo_configs[repo]['codeowners']['owners']:
-            if 'users' in owner:
-                for u in owner['users']:
-                    if u == member:
-                        return True
-            if 'teams' in owner:
-                for t in owner['teams']:
-                    for m in config.members:
-                        if m['login'] == member['login'] and f'{repo}-{t}' in m['member_of_groups']:
-                            return True
-    return False
-
-def is_member_allowed_to_merge(config, member, repo):
-    if 'branch_protection_restirctions' in config.repo_configs[repo]:
-        if member['login'] in config.repo_configs[repo]['branch_protection_restirctions']['users']:
-            return True
-        for team in config.repo_configs[repo]['branch_protection_restirctions']['teams']:
-            for group_membership in member['member_of_groups']:
-                if group_membership == f'{repo}-{team}':
-                    return True
-    else:
-        if f'{repo}-maintain' in member['member_of_groups'] or f'{repo}-push' in member['member_of_groups']:
-            return True
-    return False
+        is_codeowner = permissions.is_codeowner(member['login'], repo)
+        if not is_codeowner and not permissions.can_members_review(repo):
+            continue
+        token = get_member_token(member)
+        # A code owner approves a single pull request of every author.
+        member_reviewed_prs_of_login = []
+        for pr_id in pull_requests:
+            author = pull_requests[pr_id]['author']
+            if author == member['login'] or pr_id in assigned or (is_codeowner and author in member_reviewed_prs_of_login):
+                continue
+            executor.submit(token, pr_id, partial(pr.review, token, repo, pr_id))
+            assigned.add(pr_id)
+            member_reviewed_prs_of_login.append(author)
+    results = await executor.run()
+    for pr_id in results:
+        pr_reviews_map[pr_id] = results[pr_id] is True
+    await review_pull_requests_by_owner(pr, repo, pr_reviews_map)
+
+# The owner approves the pull requests that no member could.
+async def review_pull_requests_by_owner(pr, repo, pr_reviews_map):
+    for pr_id in pr_reviews_map:
+        if not pr_reviews_map[pr_id]:
+            await pr.review(Config.get_pat(), repo, pr_id)
+
+# Every open pull request is merged by the first member who is allowed to and succeeds.
+async def merge_pull_requests(config, permissions, pr, repo):
+    mergers = [member for member in config.members if permissions.can_merge(member['login'], repo)]
+    pull_requests = await pr.get_pull_requests(repo)
+    for pr_id in pull_requests:
+        if pull_requests[pr_id]['mergeable'] == 'CONFLICTING':
+            logging.warning(f'Did NOT merge the PR id {pr_id} in repository {repo} since it has conflicts')
+            continue
+        for member in mergers:
+            if await pr.merge(get_member_token(member), repo, pr_id):
+                break
+            logging.warning(f'Did NOT merge the PR id {pr_id} in repository {repo} by {member["login"]}')
+
+# Runs the config against an empty GitHub served in process, and estimates the requests, rate limits and duration of the real run.
+async def plan(config_file: str, orgs: list = [], concurrency: int = 10, parallel_orgs: int = 1, latency: float = Planner.DEFAULT_LATENCY):
+    planner = Planner(config_file, latency, concurrency)
+    planner.start()
+    try:
+        failed_orgs = await mock(config_file=config_file, orgs=orgs, concurrency=concurrency, parallel_orgs=parallel_orgs, plan=True)
+    finally:
+        planner.stop()
+    if len(failed_orgs) > 0:
+        logging.warning(f'The plan of {", ".join(failed_orgs)} did not complete, so their requests are undercounted')
+    return planner.get_plan(Telemetry.get().get_report())
 
 def print_banner():
     print('''
@@ -234,21 +367,33 @@ def print_banner():
         |___|                                    |___|                                                                                                                
           ''')
 
+def get_cli_argument(name, default = None):
+    try:
+        if sys.argv[sys.argv.index(name)+1].startswith('--'):
+            raise ValueError
+        return sys.argv[sys.argv.index(name)+1]
+    except (ValueError, IndexError):
+        return default
+
 if __name__ == '__main__':
     print_banner()
-    try:
-        if sys.argv[sys.argv.index("--config")+1].startswith('--'):
-            raise 
-        config_file = sys.argv[sys.argv.index("--config")+1]
-        logging.info(f'Custom config file is set to {config_file}')
-    except:
-        config_file = 'config.yaml'
-    try:
-        if sys.argv[sys.argv.index("--org")+1].startswith('--'):
-            raise
-        org = [sys.argv[sys.argv.index("--org")+1]]
+    config_file = get_cli_argument('--config', 'config.yaml')
+    logging.info(f'Config file is set to {config_file}')
+    org = [get_cli_argument('--org')] if get_cli_argument('--org') is not None else []
+    if len(org) > 0:
         logging.info(f'Custom organization is set to {org[0]}')
-    except:
-        org = []
-    asyncio.run(mock(config_file=config_file, orgs=org))
-    
+    concurrency = int(get_cli_argument('--concurrency', 10))
+    parallel_orgs = int(get_cli_argument('--parallel-orgs', 1))
+    reconcile = '--reconcile' in sys.argv
+    if reconcile:
+        logging.info('Reconciling the existing organizations with the config file')
+    resume = '--resume' in sys.argv
+    if resume:
+        logging.info('Resuming the previous run of the config file')
+    if '--plan' in sys.argv:
+        latency = float(get_cli_argument('--latency', Planner.DEFAULT_LATENCY))
+        Planner.print_plan(asyncio.run(plan(config_file=config_file, orgs=org, concurrency=concurrency, parallel_orgs=parallel_orgs, latency=latency)))
+        exit(0)
+    failed_orgs = asyncio.run(mock(config_file=config_file, orgs=org, concurrency=concurrency, parallel_orgs=parallel_orgs, reconcile=reconcile, resume=resume))
+    if len(failed_orgs) > 0:
+        exit(1)
@@ -3,10 +3,22 @@ from src.connection import ConnectionHandler
 
 class Actions:
 
-    def __init__(self, organization, config_file = None):
+    def __init__(self, organization, config = None):
         self.orgs_endpoint = f'/orgs/{organization}/actions/permissions'
         self.repos_endpoint = f'/repos/{organization}/[REPO]/actions/permissions'
-        self.conn = ConnectionHandler(config_file=config_file)
+        self.conn = ConnectionHandler(config=config)
+
+    async def get_org_permissions(self):
+        return await self.conn.get(self.orgs_endpoint)
+
+    async def get_selected_repository_ids(self):
+        return set([repo['id'] async for repo in self.conn.get_paginated(self.orgs_endpoint + '/repositories', items_key='repositories')])
+
+    async def get_repo_permissions(self, repo):
+        return await self.conn.get(self.repos_endpoint.replace('[REPO]', repo))
+
+    async def get_selected_actions_in_repo(self, repo):
+        return await self.conn.get(self.repos_endpoint.replace('[REPO]', repo) + f'/selected-actions')
 
     async def enable_selected_repositories_in_org(self):
         data = {
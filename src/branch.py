@@ -1,30 +1,57 @@
+from src.config import Config
 from src.connection import ConnectionHandler
+from src.inventory import Inventory
 
 class Branch:
 
-    def __init__(self, organization, config_file = None):
+    def __init__(self, organization, config = None):
         self.endpoint = f'/repos/{organization}/[REPO]/git/refs'
         self.branch_protection_endpoint = f'/repos/{organization}/[REPO]/branches/[BRANCH]/protection'
-        self.config_file = config_file
+        self.config = Config.load(config)
+        self.connections = {}
+        self.inventory = Inventory.load(organization, self.config)
+
+    def get_connection(self, pat = None):
+        if pat not in self.connections:
+            self.connections[pat] = ConnectionHandler(pat, self.config)
+        return self.connections[pat]
 
     async def get_main(self, pat, repository):
-        conn = ConnectionHandler(pat, self.config_file)
-        endpoint = self.endpoint.replace('[REPO]', repository) + '/heads/main'
-        resp = await conn.get(endpoint)
-        return resp['object']['sha']
+        return await self.inventory.get_branch_head(repository, 'main')
 
     async def create_branch(self, pat, repository, branch_name, source_branch_sha):
-        conn = ConnectionHandler(pat, self.config_file)
+        conn = self.get_connection(pat)
         endpoint = self.endpoint.replace('[REPO]', repository)
         data = {
             'ref': 'refs/heads/' + branch_name,
             'sha': source_branch_sha
         }
         resp = await conn.post(endpoint, json_data=data)
+        if 'object' in resp:
+            self.inventory.set_branch_head(repository, branch_name, resp['object']['sha'])
         return resp
     
+    # Returns True if the protection of the branch already matches the given settings.
+    async def is_branch_protection_current(self, repository, branch_name, enforce_admins = False, require_code_owner_reviews = False, restricted_users = [], restricted_teams = []):
+        conn = self.get_connection()
+        resp = await conn.get(self.branch_protection_endpoint.replace('[REPO]',repository).replace('[BRANCH]', branch_name))
+        if 'required_pull_request_reviews' not in resp:
+            return False
+        reviews = resp['required_pull_request_reviews']
+        restrictions = resp.get('restrictions') or {'users': [], 'teams': []}
+        current = (
+            resp.get('enforce_admins', {}).get('enabled'),
+            reviews.get('required_approving_review_count'),
+            reviews.get('require_code_owner_reviews'),
+            resp.get('allow_force_pushes', {}).get('enabled'),
+            resp.get('allow_deletions', {}).get('enabled'),
+            set(user['login'].lower() for user in restrictions['users']),
+            set(team['slug'].lower() for team in restrictions['teams'])
+        )
+        return current == (enforce_admins, 1, require_code_owner_reviews, True, True, set(u.lower() for u in restricted_users), set(t.lower() for t in restricted_teams))
+
     async def set_branch_protection(self, repository, branch_name, enforce_admins = False, require_code_owner_reviews = False, restricted_users = [], restricted_teams = []):
-        conn = ConnectionHandler(config_file=self.config_file)
+        conn = self.get_connection()
         endpoint = self.branch_protection_endpoint.replace('[REPO]',repository).replace('[BRANCH]', branch_name)
         payload = {
             'required_status_checks': {
@@ -2,35 +2,43 @@
 import os, stat, pathlib, time, logging, base64
 from src.config import Config
 from src.connection import ConnectionHandler
+from src.inventory import Inventory
 
 class CodeOwners:
     
     filename = 'CODEOWNERS'
 
-    def __init__(self, organization: str, repo_name: str, config_file = None):
-        self.config = Config() if config_file is None else Config(config_file)
+    def __init__(self, organization: str, repo_name: str, config = None):
+        self.config = Config.load(config)
         self.org = organization
         self.repo = repo_name
         self.is_codeowners_in_config = self.__is_codeowners_in_config()
-        self.conn = ConnectionHandler(config_file=config_file)
+        self.conn = ConnectionHandler(config=self.config)
+        self.inventory = Inventory.load(organization, self.config)
 
-    async def generate_codeowners(self):
+    # With reconcile, the file is only committed if its content changed.
+    async def generate_codeowners(self, reconcile = False):
         if not self.is_codeowners_in_config:
             return
         content = await self.generate_file_contents()
         filename = self.config.repo_configs[self.repo]['codeowners']['path'] + 'CODEOWNERS'
-        sha = await self.get_branch_hash()
-        await self.commit_codeowners(content, filename, sha)
-        
-    async def get_branch_hash(self):
-        resp = await self.conn.get(f'/repos/{self.org}/{self.repo}/git/ref/heads/main')
-        if 'object' not in resp:
-            resp = await self.conn.get(f'/repos/{self.org}/{self.repo}/git/ref/heads/master')
-            if 'object' not in resp:
-                resp = await self.conn.get(f'/repos/{self.org}/{self.repo}/git/ref/heads/develop')
-                if 'object' not in resp:
-                    logging.error(f'Could not find main, master or develop branch for {self.org}/{self.repo}')
-        return resp['object']['sha']
+        branch = await self.inventory.get_default_branch(self.repo)
+        if reconcile and await self.get_current_contents(filename, branch) == content:
+            return
+        sha = await self.inventory.get_branch_head(self.repo, branch)
+        if sha is None:
+            logging.error(f'Could not find the default branch {branch} of {self.org}/{self.repo}')
+            return
+        resp = await self.commit_codeowners(content, filename, sha, branch)
+        commit = ((resp.get('data') or {}).get('createCommitOnBranch') or {}).get('commit')
+        if commit is not None:
+            self.inventory.set_branch_head(self.repo, branch, commit['oid'])
+
+    async def get_current_contents(self, path: str, branch: str):
+        resp = await self.conn.get(f'/repos/{self.org}/{self.repo}/contents/{path}?ref={branch}')
+        if 'content' not in resp:
+            return None
+        return self.base64_encode(base64.b64decode(resp['content']).decode('ascii'))
 
     async def generate_file_contents(self):
         rules = ''
@@ -51,11 +59,12 @@ class CodeOwners:
                 return True
         return False
 
-    async def commit_codeowners(self, content: str, path: str, sha: str):
+    async def commit_codeowners(self, content: str, path: str, sha: str, branch: str = 'main'):
         query = """
             mutation ($input: CreateCommitOnBranchInput!) {
                 createCommitOnBranch(input: $input) {
                     commit {
+                        oid
                         url
                     }
                 }
@@ -65,7 +74,7 @@ class CodeOwners:
                     'input': {
                         'branch': {
                             'repositoryNameWithOwner': f'{self.org}/{self.repo}',
-                            'branchName': 'main'
+                            'branchName': branch
                         },
                         'message': {
                             'headline': f'GitGoat generated CODEOWNERS'
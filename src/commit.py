@@ -1,74 +1,135 @@
 from datetime import datetime, timedelta
 from random import random
-import git, os, logging, pygit2, tqdm, subprocess, base64
+import git, os, logging, pygit2, tqdm, subprocess, base64, asyncio
 from faker import Faker
 from src.config import Config
 from src.secrets import Secrets
 from src.connection import ConnectionHandler
+from src.inventory import Inventory
 
 
 class Commit:
+
+    MAX_BRANCHES_PER_QUERY = 10
     
-    def __init__(self, secrets: Secrets, access_token: str, config_file = None):
+    def __init__(self, secrets: Secrets, access_token: str, config = None):
         self.pat = access_token
         self.fake = Faker()
         self.secrets = secrets
-        self.config = Config() if config_file is None else Config(config_file)
-        self.conn = ConnectionHandler(config_file=config_file)
+        self.config = Config.load(config)
+        self.conn = ConnectionHandler(config=self.config)
 
+    # Missing branches are created from main, or from the default (or any other) branch of the repo.
     async def get_branch_hash(self, organization: str, repository: str, branch: str):
-        resp = await self.conn.get(f'/repos/{organization}/{repository}/git/refs')
-        main_sha = None
-        other_sha = None
-        for ref in resp:
-            if f'refs/heads/{branch}' == ref['ref']:
-                return ref['object']['sha']
-            elif f'refs/heads/main' == ref['ref']:
-                main_sha = ref['object']['sha']
-            else:
-                other_sha = ref['object']['sha']
+        inventory = Inventory.load(organization, self.config)
+        repo = await inventory.get_repo(repository)
+        if repo is not None and branch in repo['branches']:
+            return repo['branches'][branch]
+        base_branch = 'main'
+        if repo is not None and 'main' not in repo['branches'] and len(repo['branches']) > 0:
+            base_branch = repo['default_branch'] if repo['default_branch'] in repo['branches'] else next(iter(repo['branches']))
+        base_sha = await inventory.get_branch_head(repository, base_branch)
+        # e.g. main of a repo created with a README
+        if branch == base_branch:
+            return base_sha
         json_data = {
                     'ref':f'refs/heads/{branch}',
-                    'sha': main_sha if main_sha is not None else other_sha
+                    'sha': base_sha
                 }
         resp = await self.conn.post(f'/repos/{organization}/{repository}/git/refs', json_data=json_data)
+        inventory.set_branch_head(repository, branch, resp['object']['sha'])
         return resp['object']['sha']
 
     async def generate_random_commits(self, organization: str, repository: str, branch: str, branch_head_hash: str, count: int, days_since_latest_commit: int, commit_secret = False):
-        if days_since_latest_commit > 90 and not commit_secret:
-            return
-        query = """
-            mutation ($input: CreateCommitOnBranchInput!) {
-                createCommitOnBranch(input: $input) {
-                    commit {
+        branches = [{
+            'organization': organization,
+            'repository': repository,
+            'branch': branch,
+            'branch_head_hash': branch_head_hash,
+            'days_since_latest_commit': days_since_latest_commit,
+            'commit_secret': commit_secret
+        }]
+        return (await self.generate_random_commits_batch(branches, count))[0]
+
+    # Creates a chain of commits on every given branch (dicts with the arguments of generate_random_commits).
+    # The head of each branch is taken from the previous mutation, so the refs are never read again. Commits to the same branch
+    # must be sequential, but one commit per branch for up to MAX_BRANCHES_PER_QUERY branches is sent in a single aliased mutation.
+    # Returns per branch the last known head, the number of created commits and the error that stopped the chain, if any.
+    async def generate_random_commits_batch(self, branches: list, count: int):
+        results = [{'head': b['branch_head_hash'], 'commits': 0, 'error': None} for b in branches]
+        remaining = [Commit.get_commit_count(count, b['days_since_latest_commit'], b.get('commit_secret', False)) for b in branches]
+        while True:
+            pending = [i for i in range(len(branches)) if remaining[i] > 0 and results[i]['error'] is None]
+            if len(pending) == 0:
+                break
+            chunks = [pending[i:i + Commit.MAX_BRANCHES_PER_QUERY] for i in range(0, len(pending), Commit.MAX_BRANCHES_PER_QUERY)]
+            await asyncio.gather(*[self.__create_commits(branches, results, chunk) for chunk in chunks])
+            for i in pending:
+                remaining[i] -= 1
+        for branch, result in zip(branches, results):
+            if result['error'] is not None:
+                logging.warning(f'Created {result["commits"]} commits on {branch["organization"]}/{branch["repository"]}:{branch["branch"]} before failing. Error: {result["error"]}')
+        return results
+
+    # Branches whose latest commit is older than 90 days only get the commit with the secrets, if any.
+    def get_commit_count(count: int, days_since_latest_commit: int, commit_secret: bool):
+        if days_since_latest_commit > 90:
+            return 1 if commit_secret else 0
+        return count
+
+    async def __create_commits(self, branches, results, chunk):
+        definitions = ', '.join(f'$input{n}: CreateCommitOnBranchInput!' for n in range(len(chunk)))
+        mutations = ''.join(f"""
+                commit{n}: createCommitOnBranch(input: $input{n}) {{
+                    commit {{
+                        oid
                         url
-                    }
-                }
-            }
+                    }}
+                }}""" for n in range(len(chunk)))
+        query = f"""
+            mutation ({definitions}) {{{mutations}
+            }}
         """
+        variables = {}
+        for n, i in enumerate(chunk):
+            # The secrets go into the first commit of the chain only.
+            commit_secret = branches[i].get('commit_secret', False) and results[i]['commits'] == 0
+            variables[f'input{n}'] = self.get_commit_input(branches[i], results[i]['head'], commit_secret)
+        resp = await self.conn.post_graphql(query, variables, self.pat, weight=len(chunk))
+        data = resp.get('data') or {}
+        errors = {}
+        for error in resp.get('errors') or []:
+            path = error.get('path') or [None]
+            errors.setdefault(path[0], error.get('message'))
+        for n, i in enumerate(chunk):
+            payload = data.get(f'commit{n}')
+            if payload is not None and payload.get('commit') is not None:
+                results[i]['head'] = payload['commit']['oid']
+                results[i]['commits'] += 1
+                Inventory.load(branches[i]['organization'], self.config).set_branch_head(branches[i]['repository'], branches[i]['branch'], results[i]['head'])
+            else:
+                results[i]['error'] = errors.get(f'commit{n}', errors.get(None, 'No commit was returned'))
+
+    def get_commit_input(self, branch: dict, branch_head_hash: str, commit_secret: bool):
         additions = []
-        for _ in range(3):
+        for secret in self.secrets.get_secrets(3) if commit_secret else [None] * 3:
             additions.append({
                 'path': f'GitGoat_{self.fake.lexify(text="???????")}.txt',
-                'contents': self.base64_encode(self.secrets.get_next_secret()) if commit_secret else self.base64_encode()
-            })  
-        variables = {
-                    'input': {
-                        'branch': {
-                            'repositoryNameWithOwner': f'{organization}/{repository}',
-                            'branchName': branch
-                        },
-                        'message': {
-                            'headline': f'Random commit message from GitGoat - {self.fake.lexify(text="?????")}'
-                        },
-                        'fileChanges': {
-                            'additions': additions
-                        },
-                        "expectedHeadOid": branch_head_hash
-                    }
-                }
-        resp = await self.conn.post_graphql(query, variables, self.pat)
-        return resp
+                'contents': self.base64_encode(secret)
+            })
+        return {
+            'branch': {
+                'repositoryNameWithOwner': f'{branch["organization"]}/{branch["repository"]}',
+                'branchName': branch['branch']
+            },
+            'message': {
+                'headline': f'Random commit message from GitGoat - {self.fake.lexify(text="?????")}'
+            },
+            'fileChanges': {
+                'additions': additions
+            },
+            "expectedHeadOid": branch_head_hash
+        }
 
     def base64_encode(self, content = None):
         text = content if content is not None else self.fake.paragraph(nb_sentences=1)
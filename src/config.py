@@ -1,17 +1,21 @@
-import os, logging, base64, logging, yaml, urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+import os, logging, base64, logging, yaml
+from types import MappingProxyType
 
 class Config:
 
+    # Parsed configurations by absolute file path, so every module shares a single snapshot per file.
+    __snapshots = {}
+
     def __init__(self, filename: str = None) -> None:
         logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', datefmt='%m/%d/%Y %H:%M:%S', level=logging.INFO)
         self.filename = 'config.yaml' if filename is None else filename
         with open(self.filename, "r") as f:
-            self.__obj = yaml.load(f, Loader=yaml.FullLoader)
+            self.__obj = Config.freeze(yaml.load(f, Loader=yaml.FullLoader))
         self.base_url = self.__obj['base_url']
-        self.is_saas = True if 'api.github.com' in self.base_url else False
+        self.is_saas = self.__obj['is_saas'] if 'is_saas' in self.__obj else 'api.github.com' in self.base_url
+        self.public_repos_url = self.__obj['public_repos_url'].rstrip('/') if 'public_repos_url' in self.__obj else 'https://github.com'
+        # The Authorization header is added per handler by the ConnectionHandler.
         self.base_headers = self.__obj['base_headers']
-        self.base_headers['Authorization'] = Config.generate_auth_header(Config.get_pat())
         self.org_names = self.__obj['org_names']
         self.repo_names = self.__obj['repo_names']
         self.repo_configs = self.__obj['repo_configs']
@@ -19,7 +23,37 @@ class Config:
         self.parent_teams = self.__obj['parent_teams']
         self.members = self.__obj['members']
         self.repo_names_mapping_to_public_repos = self.__obj['repo_names_mapping_to_public_repos']
-        self.email_to_login_map = self.get_email_to_login_map()
+        self.connection = self.__obj['connection'] if 'connection' in self.__obj else MappingProxyType({})
+        self.git = MappingProxyType({'max_parallel_pushes': 4, **(self.__obj['git'] if 'git' in self.__obj else {})})
+        self.email_to_login_map = self.__build_email_to_login_map()
+        self.members_by_login = MappingProxyType({m['login']: m for m in self.members})
+        self.public_repo_to_repo_name = self.__build_public_repo_to_repo_name()
+        self.group_members = self.__build_group_members()
+        self.repo_activity = self.__build_repo_activity()
+        self.repo_members = Config.freeze({repo: list(dict.fromkeys(a['login'] for a in self.repo_activity[repo])) for repo in self.repo_activity})
+        self.__frozen = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_Config__frozen', False):
+            raise AttributeError(f'The configuration snapshot of {self.filename} is immutable')
+        super().__setattr__(name, value)
+
+    # Returns the shared snapshot of a config file, or the given snapshot as is.
+    def load(config = None):
+        if isinstance(config, Config):
+            return config
+        filename = 'config.yaml' if config is None else config
+        key = os.path.abspath(filename)
+        if key not in Config.__snapshots:
+            Config.__snapshots[key] = Config(filename)
+        return Config.__snapshots[key]
+
+    def freeze(obj):
+        if isinstance(obj, dict):
+            return MappingProxyType({k: Config.freeze(v) for k, v in obj.items()})
+        if isinstance(obj, list):
+            return tuple(Config.freeze(v) for v in obj)
+        return obj
 
     def get_pat():
         __auth_password = os.getenv('github_token')
@@ -30,16 +64,41 @@ class Config:
 
     def generate_auth_header(pat: str):
         return 'Bearer ' + pat
-    
+
     def get_email_to_login_map(self):
+        return self.email_to_login_map
+
+    def get_public_repo_url(self, public_org, public_repo):
+        return f'{self.public_repos_url}/{public_org}/{public_repo}.git'
+
+    def get_repo_name_by_public_repo(self, public_org, public_repo):
+        return self.public_repo_to_repo_name.get((public_org, public_repo))
+
+    def __build_email_to_login_map(self):
         map = {}
         for membership in self.members:
             map[membership['email']] = membership['login']
-        return map
+        return MappingProxyType(map)
 
-    def get_repo_name_by_public_repo(self, public_org, public_repo):
+    def __build_public_repo_to_repo_name(self):
+        map = {}
         for repo in self.repo_names_mapping_to_public_repos:
-            if self.repo_names_mapping_to_public_repos[repo]['org'] == public_org \
-                and self.repo_names_mapping_to_public_repos[repo]['repo'] == public_repo:
-                    return repo
-        return None
\ No newline at end of file
+            public_repo = self.repo_names_mapping_to_public_repos[repo]
+            map.setdefault((public_repo['org'], public_repo['repo']), repo)
+        return MappingProxyType(map)
+
+    # Group (team) name -> logins of the members listed in the group.
+    def __build_group_members(self):
+        map = {}
+        for member in self.members:
+            for group in member['member_of_groups']:
+                map.setdefault(group, []).append(member['login'])
+        return Config.freeze(map)
+
+    # Repo name -> the "days_since_last_commit" settings of all members in that repo, in config order.
+    def __build_repo_activity(self):
+        map = {}
+        for member in self.members:
+            for setting in member['days_since_last_commit'] if 'days_since_last_commit' in member else []:
+                map.setdefault(setting['repo'], []).append({'login': member['login'], 'email': member['email'], **setting})
+        return Config.freeze(map)
@@ -1,88 +1,209 @@
-import logging, requests, time
+import asyncio, logging, time, httpx
+from urllib.parse import urlsplit
 from src.config import Config
-from datetime import datetime
+from src.rate_limit import RateLimitGovernor
+from src.telemetry import Telemetry
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 class ConnectionHandler:
-    
-    def __init__(self, pat = None, config_file = None):
-        self.config = Config() if config_file is None else Config(config_file)
-        self.headers = self.config.base_headers
+
+    DEFAULT_SETTINGS = {
+        'max_connections': 50,
+        'max_connections_per_host': 20,
+        'max_connections_per_token': 10,
+        'http2': False,
+        'timeout': 60,
+        'content_creation_per_minute': 80,
+        'content_creation_per_hour': 500,
+        'max_rate_limit_retries': 5
+    }
+    # A single keep-alive pool is shared by every handler in the process, so per-PAT handlers are cheap to create.
+    __client = None
+    __client_loop = None
+    # Rate limits are tracked per PAT across all handlers, so a throttled member token never pauses the others.
+    __governor = None
+    # Replaces the network transport of the pool, e.g. with an in process API for a plan.
+    __transport = None
+    __host_semaphores = {}
+    __token_semaphores = {}
+
+    def __init__(self, pat = None, config = None):
+        self.config = Config.load(config)
+        self.headers = dict(self.config.base_headers)
+        self.headers['Authorization'] = Config.generate_auth_header(Config.get_pat() if pat is None else pat)
         self.base_url = self.config.base_url
-        if pat is not None:
-            self.headers['Authorization'] = Config.generate_auth_header(pat)
+        self.settings = {**ConnectionHandler.DEFAULT_SETTINGS, **self.config.connection}
 
     async def get(self, endpoint):
-        resp = requests.get(self.base_url + endpoint, headers=self.headers, verify=False)
+        resp = await self.__send('GET', endpoint)
         if resp.status_code != 200:
             logging.warning(f'The response code for the GET endpoint {endpoint} is {resp.status_code}. Message: {resp.text}')
-            await self.__validate_rate_limit(resp)
-            resp = requests.get(self.base_url + endpoint, headers=self.headers, verify=False)
+            resp = await self.__send('GET', endpoint, retry=True)
         try:
             return resp.json()
         except Exception:
             return {}
-    
+
+    # Yields the items of a list endpoint and follows the Link rel="next" header. The next page is fetched while the current one is consumed.
+    # Endpoints that wrap the list in an object (e.g. {'total_count', 'repositories'}) give the key of the list.
+    async def get_paginated(self, endpoint, per_page = 100, items_key = None):
+        separator = '&' if '?' in endpoint else '?'
+        next_page = asyncio.ensure_future(self.__get_page(f'{endpoint}{separator}per_page={per_page}'))
+        try:
+            while next_page is not None:
+                resp = await next_page
+                next_page = None
+                if resp.status_code != 200:
+                    logging.warning(f'Stopped paginating the GET endpoint {endpoint}. The response code is {resp.status_code}. Message: {resp.text}')
+                    return
+                try:
+                    items = resp.json()
+                except Exception:
+                    items = []
+                if 'next' in resp.links:
+                    next_page = asyncio.ensure_future(self.__get_page(resp.links['next']['url']))
+                if items_key is not None and isinstance(items, dict):
+                    items = items.get(items_key, [])
+                for item in items if isinstance(items, list) else []:
+                    yield item
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def __get_page(self, endpoint):
+        resp = await self.__send('GET', endpoint)
+        if resp.status_code != 200:
+            logging.warning(f'The response code for the GET endpoint {endpoint} is {resp.status_code}. Message: {resp.text}')
+            resp = await self.__send('GET', endpoint, retry=True)
+        return resp
+
     async def delete(self, endpoint):
-        resp = requests.delete(self.base_url + endpoint, headers=self.headers, verify=False)
+        resp = await self.__send('DELETE', endpoint)
         if resp.status_code != 204:
             logging.debug(f'The response code for the DELETE endpoint {endpoint} is {resp.status_code}. Message: {resp.text}')
-            await self.__validate_rate_limit(resp)
-            requests.delete(self.base_url + endpoint, headers=self.headers, verify=False)
-    
+            await self.__send('DELETE', endpoint, retry=True)
+
     async def post(self, endpoint, json_data):
-        resp = requests.post(self.base_url + endpoint, headers=self.headers, json=json_data, verify=False)
+        resp = await self.__send('POST', endpoint, json_data=json_data)
         if resp.status_code not in [200, 201, 202]:
             logging.warning(f'The response code for the POST endpoint {endpoint} is {resp.status_code}. Message: {resp.text}')
-            await self.__validate_rate_limit(resp)
-            resp = requests.post(self.base_url + endpoint, headers=self.headers, json=json_data, verify=False)
+            resp = await self.__send('POST', endpoint, json_data=json_data, retry=True)
         try:
             return resp.json()
         except Exception:
             return {}
-    
-    async def post_graphql(self, query, variables, token):
-        headers = self.headers
-        headers['Authorization'] = f'bearer {token}'        
-        resp = requests.post(self.base_url + '/graphql', headers=self.headers, json={"query": query, "variables": variables})
+
+    async def post_graphql(self, query, variables, token, weight = 1):
+        headers = {**self.headers, 'Authorization': f'bearer {token}'}
+        json_data = {"query": query, "variables": variables}
+        write = query.strip().startswith('mutation')
+        resp = await self.__send('POST', '/graphql', headers=headers, json_data=json_data, write=write, weight=weight)
         if resp.status_code not in [200, 201, 202]:
             logging.warning(f'The response code for the graphql query with the variables {variables} is {resp.status_code}. Message: {resp.text}')
-            await self.__validate_rate_limit(resp)
-            resp = requests.post(self.base_url + '/graphql', headers=self.headers, json={"query": query, "variables": variables})
+            resp = await self.__send('POST', '/graphql', headers=headers, json_data=json_data, write=write, weight=weight, retry=True)
         try:
             return resp.json()
         except Exception:
             return {}
-    
+
     async def put(self, endpoint, json_data):
-        resp = requests.put(self.base_url + endpoint, headers=self.headers, json=json_data, verify=False)
+        resp = await self.__send('PUT', endpoint, json_data=json_data)
         if resp.status_code not in [200, 201, 204]:
             logging.warning(f'The response code for the PUT endpoint {endpoint} is {resp.status_code}. Message: {resp.text}')
-            await self.__validate_rate_limit(resp)
-            resp = requests.put(self.base_url + endpoint, headers=self.headers, json=json_data, verify=False)
+            resp = await self.__send('PUT', endpoint, json_data=json_data, retry=True)
         try:
             return resp.json()
         except Exception:
             return {}
-    
+
     async def patch(self, endpoint, json_data):
-        resp = requests.patch(self.base_url + endpoint, headers=self.headers, json=json_data, verify=False)
+        resp = await self.__send('PATCH', endpoint, json_data=json_data)
         if resp.status_code not in [200]:
             logging.warning(f'The response code for the PATCH endpoint {endpoint} is {resp.status_code}. Message: {resp.text}')
-            await self.__validate_rate_limit(resp)
-            resp = requests.put(self.base_url + endpoint, headers=self.headers, json=json_data, verify=False)
+            resp = await self.__send('PATCH', endpoint, json_data=json_data, retry=True)
         try:
             return resp.json()
         except Exception:
             return {}
 
-    async def __validate_rate_limit(self, resp):
-        remaining_requests = int(resp.headers['X-RateLimit-Remaining']) if 'X-RateLimit-Remaining' in resp.headers else 2
-        if remaining_requests <= 1:
-            time_to_sleep = (int(resp.headers['X-RateLimit-Reset']) - datetime.timestamp(datetime.now())) + 1
-            logging.info(f'Primary Throttling: sleeping for {time_to_sleep} seconds')
-            time.sleep(time_to_sleep)
-        else: 
-            retry_after = int(resp.headers['Retry-After']) if 'Retry-After' in resp.headers else 0
-            if retry_after > 0:
-                logging.info(f'Secondary Throttling: sleeping for {time_to_sleep} seconds')
-                time.sleep(time_to_sleep)
\ No newline at end of file
+    # Every attempt is recorded in the telemetry of the run. Attempts after a rate limited response, and second calls by the functions above, are retries.
+    # A request that is still rate limited after max_rate_limit_retries attempts fails its task, so the task is not journaled as completed.
+    async def __send(self, method, endpoint, headers = None, json_data = None, write = None, weight = 1, retry = False):
+        headers = self.headers if headers is None else headers
+        write = method != 'GET' if write is None else write
+        url = endpoint if endpoint.startswith('http') else self.base_url + endpoint
+        # The same PAT is sent as 'Bearer' to the REST API and as 'bearer' to the GraphQL API, so the limits are keyed by the PAT itself.
+        token = ConnectionHandler.get_token(headers.get('Authorization'))
+        client = ConnectionHandler.__get_client(self.settings)
+        governor = ConnectionHandler.__get_governor(self.settings)
+        telemetry = Telemetry.get()
+        template = self.get_endpoint_template(url, write)
+        resource = 'graphql' if template.startswith('/graphql') else 'core'
+        host_semaphore = ConnectionHandler.__get_semaphore(ConnectionHandler.__host_semaphores, urlsplit(url).netloc, self.settings['max_connections_per_host'])
+        token_semaphore = ConnectionHandler.__get_semaphore(ConnectionHandler.__token_semaphores, token, self.settings['max_connections_per_token'])
+        for attempt in range(self.settings['max_rate_limit_retries']):
+            started = time.monotonic()
+            await governor.acquire(token, write, weight, resource)
+            telemetry.record_rate_limit_wait(method, template, token, time.monotonic() - started)
+            async with host_semaphore, token_semaphore:
+                started = time.monotonic()
+                resp = await client.request(method, url, headers=headers, json=json_data)
+                elapsed = time.monotonic() - started
+            telemetry.record_request(method, template, token, resp.status_code, elapsed, len(resp.request.content), len(resp.content), weight if write else 0, retry or attempt > 0)
+            if not governor.update(token, resp, resource):
+                break
+        else:
+            raise RuntimeError(f'The {method} request to {template} is still rate limited after {self.settings["max_rate_limit_retries"]} attempts. Message: {resp.text}')
+        return resp
+
+    def get_token(authorization):
+        return authorization.split(' ')[-1] if authorization is not None else None
+
+    # GraphQL queries and mutations are reported separately, since only mutations count as content creation.
+    def get_endpoint_template(self, url, write):
+        path = urlsplit(url).path
+        base_path = urlsplit(self.base_url).path.rstrip('/')
+        if len(base_path) > 0 and path.startswith(base_path):
+            path = path[len(base_path):]
+        if path.rstrip('/').endswith('/graphql'):
+            return '/graphql (mutation)' if write else '/graphql (query)'
+        return Telemetry.get_endpoint_template(path)
+
+    def __get_client(settings):
+        loop = asyncio.get_running_loop()
+        if ConnectionHandler.__client is None or ConnectionHandler.__client_loop is not loop:
+            http2 = settings['http2']
+            if http2:
+                try:
+                    import h2
+                except ImportError:
+                    logging.warning('HTTP/2 is enabled in the config file but the h2 package is not installed. Falling back to HTTP/1.1.')
+                    http2 = False
+            limits = httpx.Limits(max_connections=settings['max_connections'], max_keepalive_connections=settings['max_connections'])
+            ConnectionHandler.__client = httpx.AsyncClient(limits=limits, http2=http2, verify=False, timeout=settings['timeout'], transport=ConnectionHandler.__transport)
+            ConnectionHandler.__client_loop = loop
+            ConnectionHandler.__host_semaphores = {}
+            ConnectionHandler.__token_semaphores = {}
+        return ConnectionHandler.__client
+
+    def __get_governor(settings):
+        if ConnectionHandler.__governor is None:
+            ConnectionHandler.__governor = RateLimitGovernor(settings['content_creation_per_minute'], settings['content_creation_per_hour'])
+        return ConnectionHandler.__governor
+
+    # Sends the requests of the next pool through the given transport, and paces them with the given governor. None restores the defaults.
+    def use_transport(transport = None, governor = None):
+        ConnectionHandler.__transport = transport
+        ConnectionHandler.__governor = governor
+
+    def __get_semaphore(semaphores, key, limit):
+        if key not in semaphores:
+            semaphores[key] = asyncio.Semaphore(limit)
+        return semaphores[key]
+
+    # Closes the shared connection pool. Call it once the event loop is done with the API.
+    async def close():
+        if ConnectionHandler.__client is not None:
+            await ConnectionHandler.__client.aclose()
+            ConnectionHandler.__client = None
+            ConnectionHandler.__client_loop = None
@@ -0,0 +1,26 @@
+import asyncio, logging
+from src.rate_limit import RateLimitGovernor
+
+class IdentityExecutor:
+
+    # Keeps a queue of work per PAT. The work of one PAT runs in order, while the PATs run in parallel since each has its own rate limit.
+    def __init__(self):
+        self.queues = {}
+
+    # The function is called without arguments and must return an awaitable. Its result is returned by run() under the given key.
+    def submit(self, token, key, func):
+        self.queues.setdefault(token, []).append((key, func))
+
+    async def run(self):
+        results = {}
+        await asyncio.gather(*[self.__drain(token, self.queues[token], results) for token in self.queues])
+        self.queues = {}
+        return results
+
+    async def __drain(self, token, queue, results):
+        for key, func in queue:
+            try:
+                results[key] = await func()
+            except Exception as ex:
+                logging.warning(f'The work {key} of {RateLimitGovernor.mask(token)} failed. Exception: {ex}')
+                results[key] = ex
@@ -0,0 +1,709 @@
+import os, re, json, time, random, base64, shutil, logging, threading, subprocess, httpx, pygit2
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+class FakeGitHub:
+
+    API_PREFIX = '/api/v3'
+    # (method, path under the API prefix, handler). The path is also the key of the request statistics.
+    ROUTES = [
+        ('GET', '/orgs/{org}/repos', 'list_repos'),
+        ('POST', '/orgs/{org}/repos', 'create_repo'),
+        ('GET', '/repos/{org}/{repo}', 'get_repo'),
+        ('DELETE', '/repos/{org}/{repo}', 'delete_repo'),
+        ('GET', '/repos/{org}/{repo}/git/refs', 'list_refs'),
+        ('POST', '/repos/{org}/{repo}/git/refs', 'create_ref'),
+        ('GET', '/repos/{org}/{repo}/git/ref/heads/{branch}', 'get_ref'),
+        ('GET', '/repos/{org}/{repo}/contents/{path}', 'get_contents'),
+        ('GET', '/repos/{org}/{repo}/pulls', 'list_pulls'),
+        ('POST', '/repos/{org}/{repo}/pulls', 'create_pull'),
+        ('POST', '/repos/{org}/{repo}/pulls/{number}/reviews', 'review_pull'),
+        ('PUT', '/repos/{org}/{repo}/pulls/{number}/merge', 'merge_pull'),
+        ('GET', '/repos/{org}/{repo}/branches/{branch}/protection', 'get_protection'),
+        ('PUT', '/repos/{org}/{repo}/branches/{branch}/protection', 'set_protection'),
+        ('GET', '/repos/{org}/{repo}/actions/permissions', 'get_repo_actions'),
+        ('PUT', '/repos/{org}/{repo}/actions/permissions', 'set_repo_actions'),
+        ('GET', '/repos/{org}/{repo}/actions/permissions/selected-actions', 'get_selected_actions'),
+        ('PUT', '/repos/{org}/{repo}/actions/permissions/selected-actions', 'set_selected_actions'),
+        ('GET', '/orgs/{org}/actions/permissions', 'get_org_actions'),
+        ('PUT', '/orgs/{org}/actions/permissions', 'set_org_actions'),
+        ('GET', '/orgs/{org}/actions/permissions/repositories', 'get_org_actions_repos'),
+        ('PUT', '/orgs/{org}/actions/permissions/repositories', 'set_org_actions_repos'),
+        ('GET', '/orgs/{org}/teams', 'list_teams'),
+        ('POST', '/orgs/{org}/teams', 'create_team'),
+        ('GET', '/orgs/{org}/teams/{team}', 'get_team'),
+        ('PATCH', '/orgs/{org}/teams/{team}', 'update_team'),
+        ('DELETE', '/orgs/{org}/teams/{team}', 'delete_team'),
+        ('GET', '/orgs/{org}/teams/{team}/members', 'list_team_members'),
+        ('PUT', '/orgs/{org}/teams/{team}/memberships/{member}', 'add_team_member'),
+        ('DELETE', '/orgs/{org}/teams/{team}/memberships/{member}', 'remove_team_member'),
+        ('GET', '/orgs/{org}/teams/{team}/repos', 'list_team_repos'),
+        ('PUT', '/orgs/{org}/teams/{team}/repos/{owner}/{repo}', 'add_team_repo'),
+        ('DELETE', '/orgs/{org}/teams/{team}/repos/{owner}/{repo}', 'remove_team_repo'),
+        ('GET', '/orgs/{org}/members', 'list_members'),
+        ('GET', '/orgs/{org}/invitations', 'list_invitations'),
+        ('POST', '/orgs/{org}/invitations', 'create_invitation'),
+        ('DELETE', '/orgs/{org}/invitations/{invitation}', 'delete_invitation'),
+        ('GET', '/user/memberships/orgs/{org}', 'get_membership'),
+        ('PATCH', '/user/memberships/orgs/{org}', 'accept_membership'),
+        ('POST', '/graphql', 'graphql')
+    ]
+    ROLE_NAMES = {'pull': 'read', 'triage': 'triage', 'push': 'write', 'maintain': 'maintain', 'admin': 'admin'}
+
+    # A stand-in for the GitHub REST and GraphQL APIs used by GitGoat, with a git smart HTTP server for the repos.
+    # Every request can be delayed by latency seconds and fail with a 502 at error_rate. A token gets rate_limit API requests
+    # per rate_limit_window seconds (no limit if None). Users maps tokens and member ids to logins.
+    # With an api_url, no server is started and the API is only served in process through get_transport().
+    def __init__(self, root, latency = 0, error_rate = 0, rate_limit = None, rate_limit_window = 60, users = {}, port = 0, seed = None, api_url = None):
+        self.root = root
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.users = dict(users)
+        self.random = random.Random(seed)
+        self.orgs = {}
+        self.stats = {}
+        self.lock = threading.RLock()
+        self.__ids = 1000
+        self.__rate_limits = {}
+        self.__routes = [(method, path, re.compile('^' + re.sub(r'\{(\w+)\}', lambda m: f'(?P<{m.group(1)}>.+)' if m.group(1) == 'path' else f'(?P<{m.group(1)}>[^/]+)', path) + '$'), handler) for method, path, handler in FakeGitHub.ROUTES]
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self.server = None
+        if api_url is None:
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), FakeGitHub.get_request_handler(self))
+            self.server.daemon_threads = True
+            self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+            self.api_url = self.url + FakeGitHub.API_PREFIX
+        else:
+            self.url = self.api_url = api_url.rstrip('/')
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    # An httpx transport that serves the API requests in process, without any network access.
+    def get_transport(self):
+        return httpx.MockTransport(self.handle_transport_request)
+
+    def handle_transport_request(self, request):
+        path = request.url.path
+        base_path = urlsplit(self.api_url).path
+        if len(base_path) > 0 and path.startswith(base_path):
+            path = path[len(base_path):]
+        status, headers, payload = self.handle_api(request.method, path, dict(parse_qsl(request.url.query.decode('utf-8'))), request.headers, request.content)
+        if payload is None:
+            return httpx.Response(status, headers=headers)
+        return httpx.Response(status, headers=headers, json=payload)
+
+    # Registers an existing bare repo (e.g. a synthetic public repo) under an organization.
+    def add_repo(self, org, name):
+        with self.lock:
+            return self.__add_repo(org, name, self.get_repo_path(org, name))
+
+    def get_repo_path(self, org, name):
+        return os.path.join(self.root, org, f'{name}.git')
+
+    def get_stats(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def get_request_handler(fake):
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake.handle(self)
+
+            do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+            def log_message(self, format, *args):
+                logging.debug(f'Fake GitHub: {format % args}')
+        return RequestHandler
+
+    def handle(self, request):
+        url = urlsplit(request.path)
+        body = FakeGitHub.read_body(request)
+        if url.path.startswith(FakeGitHub.API_PREFIX):
+            status, headers, payload = self.handle_api(request.command, url.path[len(FakeGitHub.API_PREFIX):], dict(parse_qsl(url.query)), request.headers, body)
+            data = b'' if payload is None else json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json; charset=utf-8'
+        else:
+            status, headers, data = self.handle_git(request, url, body)
+        request.send_response(status)
+        for name in headers:
+            request.send_header(name, headers[name])
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def read_body(request):
+        if request.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(request.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    request.rfile.readline()
+                    return b''.join(chunks)
+                chunks.append(request.rfile.read(size))
+                request.rfile.readline()
+        length = int(request.headers.get('Content-Length', 0))
+        return request.rfile.read(length) if length > 0 else b''
+
+    def handle_api(self, method, path, query, headers, body):
+        token = headers.get('Authorization', '').split(' ')[-1]
+        for route_method, route, pattern, handler in self.__routes:
+            match = pattern.match(path)
+            if match is not None and route_method == method:
+                break
+        else:
+            route, handler, match = path, None, None
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self.lock:
+            response_headers = self.__get_rate_limit_headers(token)
+            if self.rate_limit is not None and self.__rate_limits[token]['used'] > self.rate_limit:
+                status, payload = 403, {'message': 'API rate limit exceeded'}
+            elif self.error_rate > 0 and self.random.random() < self.error_rate:
+                status, payload = 502, {'message': 'Server Error'}
+            elif handler is None:
+                status, payload = 404, {'message': 'Not Found'}
+            else:
+                try:
+                    arguments = json.loads(body) if len(body) > 0 else {}
+                except ValueError:
+                    arguments = {}
+                try:
+                    status, payload = getattr(self, handler)(self.users.get(token), query, arguments, **match.groupdict())
+                except KeyError:
+                    status, payload = 404, {'message': 'Not Found'}
+                if isinstance(payload, list):
+                    payload, link = self.__paginate(path, query, payload)
+                    if link is not None:
+                        response_headers['Link'] = link
+                elif isinstance(payload, dict) and 'total_count' in payload:
+                    items_key = next(key for key in payload if key != 'total_count')
+                    payload[items_key], link = self.__paginate(path, query, payload[items_key])
+                    if link is not None:
+                        response_headers['Link'] = link
+            self.__count(f'{method} {route}', status)
+        return status, response_headers, payload
+
+    # Serves git fetches and pushes with git http-backend.
+    def handle_git(self, request, url, body):
+        env = {
+            **os.environ,
+            'GIT_PROJECT_ROOT': self.root,
+            'GIT_HTTP_EXPORT_ALL': '1',
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'REQUEST_METHOD': request.command,
+            'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'HTTP_CONTENT_ENCODING': request.headers.get('Content-Encoding', ''),
+            'GIT_PROTOCOL': request.headers.get('Git-Protocol', ''),
+            # http-backend only accepts pushes from authenticated users.
+            'REMOTE_USER': 'gitgoat',
+            'REMOTE_ADDR': '127.0.0.1'
+        }
+        result = subprocess.run(['git', 'http-backend'], input=body, env=env, capture_output=True)
+        raw_headers, _, data = result.stdout.partition(b'\r\n\r\n')
+        status = 200
+        headers = {}
+        for line in raw_headers.decode('latin-1').split('\r\n'):
+            name, _, value = line.partition(':')
+            if name.lower() == 'status':
+                status = int(value.strip().split(' ')[0])
+            elif len(name) > 0:
+                headers[name] = value.strip()
+        with self.lock:
+            self.__count(f'{request.command} git {url.path.rsplit("/", 1)[-1]}', status)
+        return status, headers, data
+
+    def __count(self, key, status):
+        if key not in self.stats:
+            self.stats[key] = {'count': 0, 'status': {}}
+        self.stats[key]['count'] += 1
+        self.stats[key]['status'][str(status)] = self.stats[key]['status'].get(str(status), 0) + 1
+
+    def __get_rate_limit_headers(self, token):
+        if self.rate_limit is None:
+            return {}
+        now = time.time()
+        state = self.__rate_limits.get(token)
+        if state is None or now >= state['reset']:
+            state = self.__rate_limits[token] = {'used': 0, 'reset': int(now + self.rate_limit_window)}
+        state['used'] += 1
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(0, self.rate_limit - state['used'])),
+            'X-RateLimit-Reset': str(state['reset'])
+        }
+
+    def __paginate(self, path, query, items):
+        per_page = int(query.get('per_page', 30))
+        page = int(query.get('page', 1))
+        link = None
+        if page * per_page < len(items):
+            link = f'<{self.api_url}{path}?{urlencode({**query, "per_page": per_page, "page": page + 1})}>; rel="next"'
+        return items[(page - 1) * per_page:page * per_page], link
+
+    def __next_id(self):
+        self.__ids += 1
+        return self.__ids
+
+    def __get_org(self, org):
+        if org not in self.orgs:
+            self.orgs[org] = {
+                'repos': {},
+                'teams': {},
+                'members': set(),
+                'invitations': {},
+                'actions': {'enabled_repositories': 'all', 'selected_repository_ids': []}
+            }
+        return self.orgs[org]
+
+    def __add_repo(self, org, name, path):
+        repo = {
+            'id': self.__next_id(),
+            'name': name,
+            'path': path,
+            'pulls': {},
+            'protection': {},
+            'actions': {'enabled': False, 'allowed_actions': 'all'},
+            'selected_actions': {'github_owned_allowed': False, 'verified_allowed': False}
+        }
+        self.__get_org(org)['repos'][name] = repo
+        return repo
+
+    def __get_repo(self, org, name):
+        return self.orgs[org]['repos'][name]
+
+    def __open(self, repo):
+        return pygit2.Repository(repo['path'])
+
+    # An empty repo gets the first pushed branch as its default branch, like on GitHub.
+    def __get_default_branch(self, git_repo):
+        if not git_repo.head_is_unborn:
+            return git_repo.head.shorthand
+        branches = list(git_repo.branches.local)
+        if len(branches) == 0:
+            return 'main'
+        git_repo.set_head(f'refs/heads/{branches[0]}')
+        return branches[0]
+
+    def __repo_json(self, org, repo):
+        return {
+            'id': repo['id'],
+            'name': repo['name'],
+            'full_name': f'{org}/{repo["name"]}',
+            'private': True,
+            'default_branch': self.__get_default_branch(self.__open(repo))
+        }
+
+    def __get_login(self, login):
+        return login if login is not None else 'ghost'
+
+    def list_repos(self, login, query, data, org):
+        return 200, [self.__repo_json(org, repo) for repo in self.__get_org(org)['repos'].values()]
+
+    def create_repo(self, login, query, data, org):
+        if data['name'] in self.__get_org(org)['repos']:
+            return 422, {'message': 'Repository creation failed.', 'errors': [{'message': 'name already exists on this account'}]}
+        path = self.get_repo_path(org, data['name'])
+        shutil.rmtree(path, ignore_errors=True)
+        git_repo = pygit2.init_repository(path, bare=True, initial_head='main')
+        if data.get('auto_init'):
+            signature = pygit2.Signature(self.__get_login(login), f'{self.__get_login(login)}@users.noreply.github.com')
+            tree = FakeGitHub.add_file(git_repo, None, ['README.md'], git_repo.create_blob(f'# {data["name"]}\n'.encode('utf-8')))
+            git_repo.create_commit('refs/heads/main', signature, signature, 'Initial commit', tree, [])
+        repo = self.__add_repo(org, data['name'], path)
+        return 201, self.__repo_json(org, repo)
+
+    def get_repo(self, login, query, data, org, repo):
+        return 200, self.__repo_json(org, self.__get_repo(org, repo))
+
+    def delete_repo(self, login, query, data, org, repo):
+        shutil.rmtree(self.__get_repo(org, repo)['path'], ignore_errors=True)
+        del self.orgs[org]['repos'][repo]
+        return 204, None
+
+    def list_refs(self, login, query, data, org, repo):
+        git_repo = self.__open(self.__get_repo(org, repo))
+        return 200, [{'ref': f'refs/heads/{branch}', 'object': {'sha': str(git_repo.branches[branch].target), 'type': 'commit'}} for branch in git_repo.branches.local]
+
+    def create_ref(self, login, query, data, org, repo):
+        git_repo = self.__open(self.__get_repo(org, repo))
+        if data['ref'] in git_repo.references:
+            return 422, {'message': 'Reference already exists'}
+        if data.get('sha') is None or data['sha'] not in git_repo:
+            return 422, {'message': 'Object does not exist'}
+        git_repo.references.create(data['ref'], pygit2.Oid(hex=data['sha']))
+        return 201, {'ref': data['ref'], 'object': {'sha': data['sha'], 'type': 'commit'}}
+
+    def get_ref(self, login, query, data, org, repo, branch):
+        git_repo = self.__open(self.__get_repo(org, repo))
+        if branch not in git_repo.branches.local:
+            return 404, {'message': 'Not Found'}
+        return 200, {'ref': f'refs/heads/{branch}', 'object': {'sha': str(git_repo.branches[branch].target), 'type': 'commit'}}
+
+    def get_contents(self, login, query, data, org, repo, path):
+        git_repo = self.__open(self.__get_repo(org, repo))
+        branch = query.get('ref', self.__get_default_branch(git_repo))
+        try:
+            blob = git_repo.branches[branch].peel(pygit2.Commit).tree[path]
+        except (KeyError, ValueError):
+            return 404, {'message': 'Not Found'}
+        return 200, {'path': path, 'encoding': 'base64', 'content': base64.encodebytes(blob.data).decode('ascii')}
+
+    def __pull_json(self, pull):
+        return {
+            'number': pull['number'],
+            'state': pull['state'],
+            'user': {'login': pull['author']},
+            'head': {'ref': pull['head']},
+            'base': {'ref': pull['base']},
+            'mergeable': None
+        }
+
+    def list_pulls(self, login, query, data, org, repo):
+        state = query.get('state', 'open')
+        return 200, [self.__pull_json(pull) for pull in self.__get_repo(org, repo)['pulls'].values() if state == 'all' or pull['state'] == state]
+
+    def create_pull(self, login, query, data, org, repo):
+        repo = self.__get_repo(org, repo)
+        git_repo = self.__open(repo)
+        if data['head'] not in git_repo.branches.local or data['base'] not in git_repo.branches.local:
+            return 422, {'message': 'Validation Failed'}
+        number = len(repo['pulls']) + 1
+        repo['pulls'][number] = {'number': number, 'state': 'open', 'author': self.__get_login(login), 'head': data['head'], 'base': data['base'], 'reviews': []}
+        return 201, self.__pull_json(repo['pulls'][number])
+
+    def review_pull(self, login, query, data, org, repo, number):
+        pull = self.__get_repo(org, repo)['pulls'][int(number)]
+        if pull['author'] == self.__get_login(login):
+            return 422, {'message': 'Unprocessable Entity', 'errors': ['Can not approve your own pull request']}
+        pull['reviews'].append({'login': self.__get_login(login), 'state': 'APPROVED'})
+        return 200, {'id': self.__next_id(), 'user': {'login': self.__get_login(login)}, 'state': 'APPROVED'}
+
+    def merge_pull(self, login, query, data, org, repo, number):
+        repo = self.__get_repo(org, repo)
+        pull = repo['pulls'][int(number)]
+        if pull['state'] != 'open':
+            return 405, {'message': 'Pull Request is not mergeable'}
+        git_repo = self.__open(repo)
+        base = git_repo.branches[pull['base']].target
+        head = git_repo.branches[pull['head']].target
+        index = git_repo.merge_commits(base, head)
+        if index.conflicts is not None:
+            return 405, {'message': 'Pull Request is not mergeable'}
+        signature = pygit2.Signature(self.__get_login(login), f'{self.__get_login(login)}@users.noreply.github.com')
+        message = data.get('commit_title', f'Merge pull request #{number}')
+        sha = git_repo.create_commit(f'refs/heads/{pull["base"]}', signature, signature, message, index.write_tree(git_repo), [base, head])
+        pull['state'] = 'closed'
+        return 200, {'sha': str(sha), 'merged': True, 'message': 'Pull Request successfully merged'}
+
+    def get_protection(self, login, query, data, org, repo, branch):
+        protection = self.__get_repo(org, repo)['protection'].get(branch)
+        if protection is None:
+            return 404, {'message': 'Branch not protected'}
+        return 200, protection
+
+    def set_protection(self, login, query, data, org, repo, branch):
+        restrictions = data.get('restrictions')
+        protection = {
+            'url': f'{self.api_url}/repos/{org}/{repo}/branches/{branch}/protection',
+            'enforce_admins': {'enabled': data.get('enforce_admins', False)},
+            'required_pull_request_reviews': dict(data.get('required_pull_request_reviews') or {}),
+            'allow_force_pushes': {'enabled': data.get('allow_force_pushes', False)},
+            'allow_deletions': {'enabled': data.get('allow_deletions', False)}
+        }
+        if restrictions is not None:
+            protection['restrictions'] = {
+                'users': [{'login': user} for user in restrictions.get('users', [])],
+                'teams': [{'slug': team.lower()} for team in restrictions.get('teams', [])]
+            }
+        self.__get_repo(org, repo)['protection'][branch] = protection
+        return 200, protection
+
+    def get_repo_actions(self, login, query, data, org, repo):
+        return 200, self.__get_repo(org, repo)['actions']
+
+    def set_repo_actions(self, login, query, data, org, repo):
+        self.__get_repo(org, repo)['actions'].update(data)
+        return 204, None
+
+    def get_selected_actions(self, login, query, data, org, repo):
+        return 200, self.__get_repo(org, repo)['selected_actions']
+
+    def set_selected_actions(self, login, query, data, org, repo):
+        self.__get_repo(org, repo)['selected_actions'].update(data)
+        return 204, None
+
+    def get_org_actions(self, login, query, data, org):
+        return 200, {'enabled_repositories': self.__get_org(org)['actions']['enabled_repositories'], 'allowed_actions': 'all'}
+
+    def set_org_actions(self, login, query, data, org):
+        self.__get_org(org)['actions']['enabled_repositories'] = data['enabled_repositories']
+        return 204, None
+
+    def get_org_actions_repos(self, login, query, data, org):
+        ids = self.__get_org(org)['actions']['selected_repository_ids']
+        repos = [{'id': repo['id'], 'name': repo['name']} for repo in self.__get_org(org)['repos'].values() if repo['id'] in ids]
+        return 200, {'total_count': len(repos), 'repositories': repos}
+
+    def set_org_actions_repos(self, login, query, data, org):
+        self.__get_org(org)['actions']['selected_repository_ids'] = list(data['selected_repository_ids'])
+        return 204, None
+
+    def __team_json(self, org, team):
+        parent = self.__get_org(org)['teams'].get(team['parent'])
+        return {
+            'id': team['id'],
+            'name': team['name'],
+            'slug': team['slug'],
+            'privacy': 'closed',
+            'parent': {'id': parent['id'], 'name': parent['name'], 'slug': parent['slug']} if parent is not None else None
+        }
+
+    def __get_team_by_id(self, org, team_id):
+        return next((team for team in self.__get_org(org)['teams'].values() if team['id'] == team_id), None)
+
+    def list_teams(self, login, query, data, org):
+        return 200, [self.__team_json(org, team) for team in self.__get_org(org)['teams'].values()]
+
+    def create_team(self, login, query, data, org):
+        slug = data['name'].lower()
+        teams = self.__get_org(org)['teams']
+        if slug in teams:
+            return 422, {'message': 'Validation Failed', 'errors': [{'message': 'Name must be unique for this org'}]}
+        parent = self.__get_team_by_id(org, data.get('parent_team_id'))
+        teams[slug] = {'id': self.__next_id(), 'name': data['name'], 'slug': slug, 'parent': parent['slug'] if parent is not None else None, 'members': set(), 'repos': {}}
+        return 201, self.__team_json(org, teams[slug])
+
+    def get_team(self, login, query, data, org, team):
+        return 200, self.__team_json(org, self.orgs[org]['teams'][team])
+
+    def update_team(self, login, query, data, org, team):
+        team = self.orgs[org]['teams'][team]
+        if 'parent_team_id' in data:
+            parent = self.__get_team_by_id(org, data['parent_team_id'])
+            team['parent'] = parent['slug'] if parent is not None else None
+        return 200, self.__team_json(org, team)
+
+    # Deleting a team also deletes its child teams.
+    def delete_team(self, login, query, data, org, team):
+        teams = self.orgs[org]['teams']
+        pending = [teams[team]['slug']]
+        while len(pending) > 0:
+            slug = pending.pop()
+            pending.extend(child for child in teams if teams[child]['parent'] == slug)
+            teams.pop(slug, None)
+        return 204, None
+
+    # The members of the child teams are listed as well.
+    def list_team_members(self, login, query, data, org, team):
+        teams = self.orgs[org]['teams']
+        members = set(teams[team]['members'])
+        pending = [team]
+        while len(pending) > 0:
+            slug = pending.pop()
+            for child in teams:
+                if teams[child]['parent'] == slug:
+                    members.update(teams[child]['members'])
+                    pending.append(child)
+        return 200, [{'login': member} for member in sorted(members)]
+
+    def add_team_member(self, login, query, data, org, team, member):
+        self.orgs[org]['teams'][team]['members'].add(member)
+        return 200, {'state': 'active', 'role': data.get('role', 'member')}
+
+    def remove_team_member(self, login, query, data, org, team, member):
+        members = self.orgs[org]['teams'][team]['members']
+        if member not in members:
+            return 404, {'message': 'Not Found'}
+        members.remove(member)
+        return 204, None
+
+    def list_team_repos(self, login, query, data, org, team):
+        repos = self.orgs[org]['teams'][team]['repos']
+        return 200, [{'name': repo, 'role_name': FakeGitHub.ROLE_NAMES.get(repos[repo], repos[repo])} for repo in repos]
+
+    def add_team_repo(self, login, query, data, org, team, owner, repo):
+        self.__get_repo(owner, repo)
+        self.orgs[org]['teams'][team]['repos'][repo] = data.get('permission', 'pull')
+        return 204, None
+
+    def remove_team_repo(self, login, query, data, org, team, owner, repo):
+        self.orgs[org]['teams'][team]['repos'].pop(repo, None)
+        return 204, None
+
+    def list_members(self, login, query, data, org):
+        return 200, [{'login': member} for member in sorted(self.__get_org(org)['members'])]
+
+    def list_invitations(self, login, query, data, org):
+        return 200, list(self.__get_org(org)['invitations'].values())
+
+    def create_invitation(self, login, query, data, org):
+        invitee = self.users.get(data.get('invitee_id'))
+        if invitee is None:
+            return 422, {'message': 'Validation Failed'}
+        invitation = {'id': self.__next_id(), 'login': invitee}
+        self.__get_org(org)['invitations'][invitation['id']] = invitation
+        return 201, invitation
+
+    def delete_invitation(self, login, query, data, org, invitation):
+        del self.orgs[org]['invitations'][int(invitation)]
+        return 204, None
+
+    def get_membership(self, login, query, data, org):
+        org_state = self.__get_org(org)
+        if login in org_state['members']:
+            return 200, {'state': 'active', 'role': 'member'}
+        if any(invitation['login'] == login for invitation in org_state['invitations'].values()):
+            return 200, {'state': 'pending', 'role': 'member'}
+        return 404, {'message': 'Not Found'}
+
+    def accept_membership(self, login, query, data, org):
+        org_state = self.__get_org(org)
+        invitations = [invitation_id for invitation_id in org_state['invitations'] if org_state['invitations'][invitation_id]['login'] == login]
+        if len(invitations) == 0 and login not in org_state['members']:
+            return 404, {'message': 'Not Found'}
+        for invitation_id in invitations:
+            del org_state['invitations'][invitation_id]
+        org_state['members'].add(login)
+        return 200, {'state': 'active', 'role': 'member'}
+
+    def graphql(self, login, query, data, **kwargs):
+        document = data.get('query', '')
+        variables = data.get('variables') or {}
+        if 'createCommitOnBranch' in document:
+            return 200, self.__create_commits_on_branches(login, document, variables)
+        if 'team(' in document:
+            return 200, self.__query_team_members(variables)
+        if 'organization(' in document:
+            return 200, self.__query_organization(variables)
+        if 'repository(' in document:
+            return 200, self.__query_repository(document, variables)
+        return 200, {'errors': [{'message': 'The fake GitHub does not support this query'}]}
+
+    def __query_organization(self, variables):
+        org = self.__get_org(variables['org'])
+        start = int(variables['cursor']) if variables.get('cursor') else 0
+        names = list(org['repos'])
+        nodes = []
+        for name in names[start:start + 100]:
+            repo = org['repos'][name]
+            git_repo = self.__open(repo)
+            nodes.append({
+                'name': name,
+                'databaseId': repo['id'],
+                'defaultBranchRef': {'name': git_repo.head.shorthand} if not git_repo.head_is_unborn else None,
+                'refs': FakeGitHub.__get_refs(git_repo, None),
+                'pullRequests': FakeGitHub.__get_pull_requests(repo, None)
+            })
+        end = start + len(nodes)
+        return {'data': {'organization': {'repositories': FakeGitHub.get_page(nodes, end, len(names))}}}
+
+    # The direct members of a team. Every member of the fake is a plain member, none is a maintainer.
+    def __query_team_members(self, variables):
+        teams = self.__get_org(variables['org'])['teams']
+        if variables['team'] not in teams:
+            return {'data': {'organization': {'team': None}}}
+        start = int(variables['cursor']) if variables.get('cursor') else 0
+        members = sorted(teams[variables['team']]['members'])
+        edges = [{'role': 'MEMBER', 'node': {'login': member}} for member in members[start:start + 100]]
+        page = FakeGitHub.get_page(edges, start + len(edges), len(members))
+        return {'data': {'organization': {'team': {'members': {'pageInfo': page['pageInfo'], 'edges': page['nodes']}}}}}
+
+    # The following pages of the nested connections of a repository.
+    def __query_repository(self, document, variables):
+        org = self.__get_org(variables['org'])
+        if variables['repo'] not in org['repos']:
+            return {'data': {'repository': None}, 'errors': [{'type': 'NOT_FOUND', 'message': f'Could not resolve to a Repository with the name {variables["org"]}/{variables["repo"]}.'}]}
+        repo = org['repos'][variables['repo']]
+        if 'pullRequests(' in document:
+            return {'data': {'repository': {'pullRequests': FakeGitHub.__get_pull_requests(repo, variables.get('cursor'))}}}
+        return {'data': {'repository': {'refs': FakeGitHub.__get_refs(self.__open(repo), variables.get('cursor'))}}}
+
+    def __get_refs(git_repo, cursor):
+        start = int(cursor) if cursor else 0
+        branches = list(git_repo.branches.local)
+        nodes = [{'name': branch, 'target': {'oid': str(git_repo.branches[branch].target)}} for branch in branches[start:start + 100]]
+        return FakeGitHub.get_page(nodes, start + len(nodes), len(branches))
+
+    def __get_pull_requests(repo, cursor):
+        start = int(cursor) if cursor else 0
+        pulls = [pull for pull in repo['pulls'].values() if pull['state'] == 'open']
+        nodes = [{
+            'number': pull['number'],
+            'author': {'login': pull['author']},
+            'headRefName': pull['head'],
+            'reviewDecision': FakeGitHub.__get_review_decision(repo, pull),
+            'reviews': {'totalCount': len([review for review in pull['reviews'] if review['state'] == 'APPROVED'])},
+            'mergeable': 'UNKNOWN'
+        } for pull in pulls[start:start + 100]]
+        return FakeGitHub.get_page(nodes, start + len(nodes), len(pulls))
+
+    # Like on GitHub, there is no review decision unless the base branch requires reviews.
+    def __get_review_decision(repo, pull):
+        if len(repo['protection'].get(pull['base'], {}).get('required_pull_request_reviews', {})) == 0:
+            return None
+        return 'APPROVED' if any(review['state'] == 'APPROVED' for review in pull['reviews']) else 'REVIEW_REQUIRED'
+
+    # Cursors are the offsets of the next nodes.
+    def get_page(nodes, end, total):
+        return {'pageInfo': {'hasNextPage': end < total, 'endCursor': str(end)}, 'nodes': nodes}
+
+    # The mutations of a document run in order. A failed mutation returns null under its alias with an error for its path.
+    def __create_commits_on_branches(self, login, document, variables):
+        data = {}
+        errors = []
+        for alias, variable in re.findall(r'(?:(\w+)\s*:\s*)?createCommitOnBranch\s*\(\s*input\s*:\s*\$(\w+)\s*\)', document):
+            alias = alias if len(alias) > 0 else 'createCommitOnBranch'
+            try:
+                data[alias] = {'commit': self.__create_commit_on_branch(login, variables[variable])}
+            except ValueError as ex:
+                data[alias] = None
+                errors.append({'path': [alias], 'message': str(ex)})
+        return {'data': data, 'errors': errors} if len(errors) > 0 else {'data': data}
+
+    def __create_commit_on_branch(self, login, commit_input):
+        org, name = commit_input['branch']['repositoryNameWithOwner'].split('/', 1)
+        branch = commit_input['branch']['branchName']
+        if org not in self.orgs or name not in self.orgs[org]['repos']:
+            raise ValueError(f'Could not resolve to a Repository with the name {org}/{name}.')
+        git_repo = self.__open(self.orgs[org]['repos'][name])
+        if branch not in git_repo.branches.local:
+            raise ValueError(f'A ref named "refs/heads/{branch}" does not exist.')
+        head = git_repo.branches[branch].target
+        if str(head) != commit_input.get('expectedHeadOid'):
+            raise ValueError(f'Expected branch to point to "{commit_input.get("expectedHeadOid")}" but it did not. Pull and try again.')
+        tree = git_repo[head].tree
+        tree_id = tree.id
+        for addition in commit_input.get('fileChanges', {}).get('additions', []):
+            blob = git_repo.create_blob(base64.b64decode(addition['contents']))
+            tree_id = FakeGitHub.add_file(git_repo, git_repo[tree_id], addition['path'].split('/'), blob)
+        signature = pygit2.Signature(self.__get_login(login), f'{self.__get_login(login)}@users.noreply.github.com')
+        oid = git_repo.create_commit(f'refs/heads/{branch}', signature, signature, commit_input['message']['headline'], tree_id, [head])
+        return {'oid': str(oid), 'url': f'{self.url}/{org}/{name}/commit/{oid}'}
+
+    # Writes the tree with the blob added at the given path and returns its id.
+    def add_file(git_repo, tree, parts, blob):
+        builder = git_repo.TreeBuilder(tree) if tree is not None else git_repo.TreeBuilder()
+        if len(parts) == 1:
+            builder.insert(parts[0], blob, pygit2.GIT_FILEMODE_BLOB)
+        else:
+            subtree = None
+            if tree is not None and parts[0] in tree and tree[parts[0]].type_str == 'tree':
+                subtree = git_repo[tree[parts[0]].id]
+            builder.insert(parts[0], FakeGitHub.add_file(git_repo, subtree, parts[1:], blob), pygit2.GIT_FILEMODE_TREE)
+        return builder.write()
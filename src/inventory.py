@@ -0,0 +1,259 @@
+import asyncio, logging, threading
+from src.config import Config
+from src.connection import ConnectionHandler
+
+class Inventory:
+
+    # Every repo of the organization with the heads of its branches and its open pull requests, 100 repos per page.
+    QUERY = """
+        query ($org: String!, $cursor: String) {
+            organization(login: $org) {
+                repositories(first: 100, after: $cursor) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    nodes {
+                        name
+                        databaseId
+                        defaultBranchRef {
+                            name
+                        }
+                        refs(refPrefix: "refs/heads/", first: 100) {
+                            pageInfo {
+                                hasNextPage
+                                endCursor
+                            }
+                            nodes {
+                                name
+                                target {
+                                    oid
+                                }
+                            }
+                        }
+                        pullRequests(states: OPEN, first: 100) {
+                            pageInfo {
+                                hasNextPage
+                                endCursor
+                            }
+                            nodes {
+                                number
+                                author {
+                                    login
+                                }
+                                headRefName
+                                reviews(states: APPROVED, first: 1) {
+                                    totalCount
+                                }
+                                mergeable
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """
+    # The following pages of the branches and open pull requests of a repo with more than 100 of them.
+    REFS_QUERY = """
+        query ($org: String!, $repo: String!, $cursor: String) {
+            repository(owner: $org, name: $repo) {
+                refs(refPrefix: "refs/heads/", first: 100, after: $cursor) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    nodes {
+                        name
+                        target {
+                            oid
+                        }
+                    }
+                }
+            }
+        }
+    """
+    PULL_REQUESTS_QUERY = """
+        query ($org: String!, $repo: String!, $cursor: String) {
+            repository(owner: $org, name: $repo) {
+                pullRequests(states: OPEN, first: 100, after: $cursor) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    nodes {
+                        number
+                        author {
+                            login
+                        }
+                        headRefName
+                        reviews(states: APPROVED, first: 1) {
+                            totalCount
+                        }
+                        mergeable
+                    }
+                }
+            }
+        }
+    """
+    # A single inventory per organization and API, so every module reads and updates the same snapshot.
+    __inventories = {}
+    __inventories_lock = threading.Lock()
+
+    def __init__(self, organization, config = None):
+        self.org = organization
+        self.config = Config.load(config)
+        self.conn = ConnectionHandler(config=self.config)
+        # Repo name -> {'id', 'default_branch', 'branches': {branch name -> head oid}, 'pull_requests': {number -> pull request}}
+        self.repos = {}
+        self.__loaded = False
+        self.__load_lock = None
+
+    # Returns the shared inventory of an organization.
+    def load(organization, config = None):
+        config = Config.load(config)
+        key = (config.base_url, organization)
+        with Inventory.__inventories_lock:
+            if key not in Inventory.__inventories:
+                Inventory.__inventories[key] = Inventory(organization, config)
+            return Inventory.__inventories[key]
+
+    # Reads the whole organization with one paginated GraphQL query. Later reads are served from memory.
+    async def refresh(self):
+        repos = {}
+        cursor = None
+        while True:
+            resp = await self.conn.post_graphql(Inventory.QUERY, {'org': self.org, 'cursor': cursor}, Config.get_pat())
+            page = ((resp.get('data') or {}).get('organization') or {}).get('repositories')
+            if page is None:
+                logging.warning(f'Could not read the inventory of the organization {self.org}. Falling back to per repo lookups. Errors: {resp.get("errors")}')
+                break
+            remaining_pages = []
+            for repo in page['nodes']:
+                repos[repo['name']] = {
+                    'id': repo['databaseId'],
+                    'default_branch': repo['defaultBranchRef']['name'] if repo['defaultBranchRef'] is not None else None,
+                    'branches': {},
+                    'pull_requests': {}
+                }
+                Inventory.__add_refs(repos[repo['name']], repo['refs']['nodes'])
+                Inventory.__add_pull_requests(repos[repo['name']], repo['pullRequests']['nodes'])
+                if repo['refs']['pageInfo']['hasNextPage']:
+                    remaining_pages.append(self.__load_remaining_pages(repos[repo['name']], repo['name'], Inventory.REFS_QUERY, 'refs', repo['refs']['pageInfo']['endCursor'], Inventory.__add_refs))
+                if repo['pullRequests']['pageInfo']['hasNextPage']:
+                    remaining_pages.append(self.__load_remaining_pages(repos[repo['name']], repo['name'], Inventory.PULL_REQUESTS_QUERY, 'pullRequests', repo['pullRequests']['pageInfo']['endCursor'], Inventory.__add_pull_requests))
+            await asyncio.gather(*remaining_pages)
+            if not page['pageInfo']['hasNextPage']:
+                break
+            cursor = page['pageInfo']['endCursor']
+        # Writes recorded while the inventory was read are newer than the query results.
+        repos.update(self.repos)
+        self.repos = repos
+        self.__loaded = True
+
+    async def __load_remaining_pages(self, repo, repo_name, query, connection, cursor, add):
+        while cursor is not None:
+            resp = await self.conn.post_graphql(query, {'org': self.org, 'repo': repo_name, 'cursor': cursor}, Config.get_pat())
+            page = ((resp.get('data') or {}).get('repository') or {}).get(connection)
+            if page is None:
+                logging.warning(f'Could not read all the {connection} of the repository {repo_name}. Falling back to per branch lookups. Errors: {resp.get("errors")}')
+                return
+            add(repo, page['nodes'])
+            cursor = page['pageInfo']['endCursor'] if page['pageInfo']['hasNextPage'] else None
+
+    def __add_refs(repo, refs):
+        for ref in refs:
+            repo['branches'][ref['name']] = ref['target']['oid']
+
+    def __add_pull_requests(repo, pull_requests):
+        for pull_request in pull_requests:
+            author = pull_request['author']['login'] if pull_request['author'] is not None else None
+            # reviewDecision is null unless the repo requires reviews, so an approval is read from the reviews themselves.
+            review_decision = 'APPROVED' if pull_request['reviews']['totalCount'] > 0 else None
+            Inventory.__add_pull_request(repo, pull_request['number'], author, pull_request['headRefName'], review_decision, pull_request['mergeable'])
+
+    async def ensure_loaded(self):
+        if self.__loaded:
+            return
+        if self.__load_lock is None:
+            self.__load_lock = asyncio.Lock()
+        async with self.__load_lock:
+            if not self.__loaded:
+                await self.refresh()
+
+    async def get_repo_names(self):
+        await self.ensure_loaded()
+        return list(self.repos)
+
+    # Repos that were not created through GitGoat since the inventory was read are looked up once.
+    async def get_repo(self, repo_name):
+        await self.ensure_loaded()
+        if repo_name not in self.repos:
+            resp = await self.conn.get(f'/repos/{self.org}/{repo_name}')
+            if 'id' not in resp:
+                return None
+            self.set_repo(repo_name, resp['id'], resp.get('default_branch'))
+        return self.repos[repo_name]
+
+    async def get_repo_id(self, repo_name):
+        repo = await self.get_repo(repo_name)
+        return repo['id'] if repo is not None else None
+
+    async def get_default_branch(self, repo_name):
+        repo = await self.get_repo(repo_name)
+        return repo['default_branch'] if repo is not None and repo['default_branch'] is not None else 'main'
+
+    # Branches that were not created through GitGoat since the inventory was read are looked up once.
+    async def get_branch_head(self, repo_name, branch):
+        repo = await self.get_repo(repo_name)
+        if repo is None:
+            return None
+        if branch not in repo['branches']:
+            resp = await self.conn.get(f'/repos/{self.org}/{repo_name}/git/ref/heads/{branch}')
+            if 'object' not in resp:
+                return None
+            repo['branches'][branch] = resp['object']['sha']
+        return repo['branches'][branch]
+
+    # Open pull requests by number (as a string), each with its author, head branch, review decision and mergeable state.
+    async def get_pull_requests(self, repo_name):
+        repo = await self.get_repo(repo_name)
+        return dict(repo['pull_requests']) if repo is not None else {}
+
+    # The following functions record the writes of GitGoat, so the inventory never has to be read again.
+    def set_repo(self, repo_name, repo_id, default_branch = None):
+        self.repos[repo_name] = {
+            'id': repo_id,
+            'default_branch': default_branch,
+            'branches': {},
+            'pull_requests': {}
+        }
+
+    def remove_repo(self, repo_name):
+        self.repos.pop(repo_name, None)
+
+    def set_branch_head(self, repo_name, branch, oid):
+        if repo_name not in self.repos or oid is None:
+            return
+        self.repos[repo_name]['branches'][branch] = oid
+        if self.repos[repo_name]['default_branch'] is None:
+            self.repos[repo_name]['default_branch'] = branch
+
+    def add_pull_request(self, repo_name, number, author, head, review_decision = None, mergeable = 'UNKNOWN'):
+        if repo_name in self.repos:
+            Inventory.__add_pull_request(self.repos[repo_name], number, author, head, review_decision, mergeable)
+
+    def set_pull_request_review(self, repo_name, number, review_decision):
+        if repo_name in self.repos and str(number) in self.repos[repo_name]['pull_requests']:
+            self.repos[repo_name]['pull_requests'][str(number)]['review_decision'] = review_decision
+
+    def remove_pull_request(self, repo_name, number):
+        if repo_name in self.repos:
+            self.repos[repo_name]['pull_requests'].pop(str(number), None)
+
+    def __add_pull_request(repo, number, author, head, review_decision, mergeable):
+        repo['pull_requests'][str(number)] = {
+            'author': author,
+            'head': head,
+            'review_decision': review_decision,
+            'mergeable': mergeable
+        }
@@ -0,0 +1,74 @@
+import os, json, time, hashlib, logging
+
+class Journal:
+
+    JOURNAL_PATH = 'journal'
+
+    # An append-only JSONL file of the completed tasks of an organization, kept per config file content.
+    # Every line is flushed to disk when the task completes, so the journal survives a crash of the run.
+    # Besides tasks, it keeps named values that must stay as the first run saw them, e.g. the branches that existed before it.
+    def __init__(self, organization, config_filename, resume = False, path = None):
+        self.org = organization
+        self.config_hash = Journal.get_config_hash(config_filename)
+        path = Journal.JOURNAL_PATH if path is None else path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.filename = os.path.join(path, f'{organization}-{self.config_hash[:12]}.jsonl')
+        self.states = {}
+        self.completed = self.load() if resume else set()
+        if resume:
+            logging.info(f'Resuming {organization}: {len(self.completed)} tasks were already completed according to {self.filename}')
+        self.__file = open(self.filename, 'a' if resume else 'w')
+        if resume and self.__file.tell() > 0 and not Journal.ends_with_newline(self.filename):
+            self.__file.write('\n')
+
+    def ends_with_newline(filename):
+        with open(filename, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def get_config_hash(config_filename):
+        with open(config_filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def load(self):
+        completed = set()
+        try:
+            with open(self.filename, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line is incomplete if the run was killed while writing it.
+                        continue
+                    if entry.get('org') != self.org or entry.get('config') != self.config_hash:
+                        continue
+                    if 'state' in entry:
+                        self.states[entry['state']] = entry['value']
+                    else:
+                        completed.add(entry['task'])
+        except OSError:
+            pass
+        return completed
+
+    def is_completed(self, task_name):
+        return task_name in self.completed
+
+    def record(self, task_name):
+        self.completed.add(task_name)
+        self.__write({'org': self.org, 'config': self.config_hash, 'task': task_name, 'time': time.time()})
+
+    def get_state(self, name, default = None):
+        return self.states.get(name, default)
+
+    def set_state(self, name, value):
+        self.states[name] = value
+        self.__write({'org': self.org, 'config': self.config_hash, 'state': name, 'value': value, 'time': time.time()})
+
+    def __write(self, entry):
+        self.__file.write(json.dumps(entry) + '\n')
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def close(self):
+        self.__file.close()
@@ -4,41 +4,51 @@ from src.connection import ConnectionHandler
 
 class Membership:
 
-    def __init__(self, organization, config_file = None):
+    def __init__(self, organization, config = None):
         self.org = organization
         self.memberships_endpoint = f'/user/memberships/orgs/{organization}'
         self.members_endpoint = f'/orgs/{organization}/members'
         self.invitations_endpoint = f'/orgs/{organization}/invitations'
-        self.config = Config() if config_file is None else Config(config_file)
+        self.config = Config.load(config)
+        self.conn = ConnectionHandler(config=self.config)
 
     # Invite all members that are configured in the config file.
     async def invite_members(self):
-        conn = ConnectionHandler(config_file=self.config.filename)
-        current_members = await conn.get(self.members_endpoint)
-        skip_members = [m['login'] for m in current_members] if len(current_members) > 0 else []
-        await self.__cancel_invitations(conn)
+        skip_members = await self.get_member_logins()
+        await self.cancel_invitations()
         for member in self.config.members:
-            if member['login'] in skip_members:
-                continue
-            data = {
-                'invitee_id': member['member_id']
-            }
-            await conn.post(self.invitations_endpoint, json_data=data)
-
-    async def __cancel_invitations(self, conn: ConnectionHandler):
+            await self.invite_member(member, skip_members)
+
+    async def get_member_logins(self):
+        return set([m['login'] async for m in self.conn.get_paginated(self.members_endpoint)])
+
+    async def get_invitation_logins(self):
+        return set([invitation['login'] async for invitation in self.conn.get_paginated(self.invitations_endpoint)])
+
+    async def invite_member(self, member, skip_members = set()):
+        if member['login'] in skip_members:
+            return
+        data = {
+            'invitee_id': member['member_id']
+        }
+        await self.conn.post(self.invitations_endpoint, json_data=data)
+
+    async def cancel_invitations(self):
         if not self.config.is_saas:
-            return 
-        resp = await conn.get(self.invitations_endpoint)
-        for invitation in resp:
-            await conn.delete(self.invitations_endpoint + '/' + str(invitation['id']))
+            return
+        invitations = [invitation async for invitation in self.conn.get_paginated(self.invitations_endpoint)]
+        for invitation in invitations:
+            await self.conn.delete(self.invitations_endpoint + '/' + str(invitation['id']))
             logging.info(f'Cancelled the existing (before this execution) invitation for user {str(invitation["login"])}')
 
     # Accept an invitation to an organization by a given user PAT.
-    async def accept_invitation_to_org(self, pat):
+    async def accept_invitation_to_org(self, pat, reconcile = False):
         if not self.config.is_saas:
-            return 
-        conn = ConnectionHandler(pat, self.config.filename)
+            return
+        conn = ConnectionHandler(pat, self.config)
+        if reconcile and (await conn.get(self.memberships_endpoint)).get('state') == 'active':
+            return
         data = {
             'state': 'active'
         }
-        await conn.patch(self.memberships_endpoint, json_data=data)
\ No newline at end of file
+        await conn.patch(self.memberships_endpoint, json_data=data)
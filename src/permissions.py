@@ -0,0 +1,121 @@
+from src.config import Config
+
+class Permissions:
+
+    # Team permissions that allow merging to a repo without branch protection restrictions.
+    MERGE_PERMISSIONS = ['maintain', 'push']
+
+    # Compiles who owns, reviews and merges every repo, so the review, merge and branch protection phases only do set lookups.
+    def __init__(self, config = None):
+        self.config = Config.load(config)
+        self.team_children = self.__build_team_children()
+        self.team_members = {team: frozenset(self.__expand_team_members(team)) for team in self.__get_team_names()}
+        self.repo_teams = self.__build_repo_teams()
+        self.codeowners = {}
+        self.mergers = {}
+        self.branch_protection = {}
+        self.open_review_repos = set()
+        for repo in self.config.repo_configs:
+            repo_config = self.config.repo_configs[repo]
+            self.codeowners[repo] = frozenset(self.__build_codeowners(repo, repo_config))
+            self.mergers[repo] = frozenset(self.__build_mergers(repo, repo_config))
+            if 'branch_protection_restirctions' in repo_config:
+                restrictions = repo_config['branch_protection_restirctions']
+                self.branch_protection[repo] = {
+                    'enforce_admins': restrictions['enforce_admins'],
+                    'require_code_owner_reviews': restrictions['require_code_owner_reviews'],
+                    'users': list(restrictions['users']),
+                    'teams': [f'{repo}-{team}' for team in restrictions['teams']]
+                }
+                if 'require_code_owner_reviews' in restrictions and not restrictions['require_code_owner_reviews']:
+                    self.open_review_repos.add(repo)
+
+    def is_codeowner(self, login, repo):
+        return login in self.codeowners.get(repo, ())
+
+    # Any member can approve pull requests when the repo does not require code owner reviews.
+    def can_members_review(self, repo):
+        return repo in self.open_review_repos
+
+    def can_merge(self, login, repo):
+        return login in self.mergers.get(repo, ())
+
+    def get_team_members(self, team):
+        return self.team_members.get(team, frozenset())
+
+    def __get_team_names(self):
+        teams = set(self.config.group_members)
+        for repo in self.config.teams:
+            teams.update(f'{repo["repo"]}-{gp}' for gp in repo['group_postfixes'])
+        for parent_team in self.config.parent_teams:
+            teams.add(parent_team['team'])
+            teams.update(parent_team['children'])
+        return teams
+
+    def __build_team_children(self):
+        children = {}
+        for parent_team in self.config.parent_teams:
+            children.setdefault(parent_team['team'], []).extend(parent_team['children'])
+        return children
+
+    # The members of a team include the members of all its child teams.
+    def __expand_team_members(self, team):
+        members = set()
+        pending = [team]
+        visited = set()
+        while len(pending) > 0:
+            current = pending.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            members.update(self.config.group_members.get(current, ()))
+            pending.extend(self.team_children.get(current, []))
+        return members
+
+    # Repo name -> {team name -> permission}. Child teams inherit the repo permissions of their parent teams.
+    def __build_repo_teams(self):
+        repo_teams = {}
+        for repo in self.config.teams:
+            for gp in repo['group_postfixes']:
+                repo_teams.setdefault(repo['repo'], {})[f'{repo["repo"]}-{gp}'] = gp
+        for parent_team in self.config.parent_teams:
+            inheriting_teams = [parent_team['team']] + self.__get_descendants(parent_team['team'])
+            for repo in parent_team['repo_permissions']:
+                for team in inheriting_teams:
+                    repo_teams.setdefault(repo, {}).setdefault(team, parent_team['repo_permissions'][repo])
+        return repo_teams
+
+    def __get_descendants(self, team):
+        descendants = []
+        pending = list(self.team_children.get(team, []))
+        while len(pending) > 0:
+            current = pending.pop()
+            if current in descendants:
+                continue
+            descendants.append(current)
+            pending.extend(self.team_children.get(current, []))
+        return descendants
+
+    def __build_codeowners(self, repo, repo_config):
+        owners = set()
+        if 'codeowners' not in repo_config or 'owners' not in repo_config['codeowners']:
+            return owners
+        for owner in repo_config['codeowners']['owners']:
+            owners.update(owner['users'] if 'users' in owner else [])
+            for team in owner['teams'] if 'teams' in owner else []:
+                owners.update(self.get_team_members(f'{repo}-{team}'))
+        return owners
+
+    def __build_mergers(self, repo, repo_config):
+        if 'branch_protection_restirctions' in repo_config:
+            restrictions = repo_config['branch_protection_restirctions']
+            mergers = set(restrictions['users'])
+            for team in restrictions['teams']:
+                mergers.update(self.get_team_members(f'{repo}-{team}'))
+            return mergers
+        mergers = set()
+        teams = self.repo_teams.get(repo, {})
+        for team in teams:
+            if teams[team] in Permissions.MERGE_PERMISSIONS:
+                mergers.update(self.get_team_members(team))
+        return mergers
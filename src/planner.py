@@ -0,0 +1,79 @@
+import os, math, shutil, tempfile
+from src.config import Config
+from src.connection import ConnectionHandler
+from src.rate_limit import RateLimitGovernor
+from src.fake_github import FakeGitHub
+
+class Planner:
+
+    # GitHub allows 5000 REST and GraphQL requests per hour to a PAT.
+    REQUESTS_PER_HOUR = 5000
+    DEFAULT_LATENCY = 0.3
+    # No request is paced while planning, the pacing is estimated from the planned requests instead.
+    UNLIMITED = 10**9
+
+    # Serves the API of a new, empty GitHub in process, so a run can be planned without any network access or credentials.
+    def __init__(self, config = None, latency = DEFAULT_LATENCY, concurrency = 10):
+        self.config = Config.load(config)
+        self.latency = latency
+        self.concurrency = concurrency
+        self.settings = {**ConnectionHandler.DEFAULT_SETTINGS, **self.config.connection}
+        self.owner_token = os.getenv('github_token')
+        if self.owner_token is None:
+            self.owner_token = os.environ['github_token'] = 'ghp_gitgoat_plan_owner'
+        users = {self.owner_token: 'owner'}
+        for member in self.config.members:
+            users[member['token'] if 'ghp_' in member['token'] else 'ghp_' + member['token']] = member['login']
+            users[member['member_id']] = member['login']
+        self.root = tempfile.mkdtemp(prefix='gitgoat-plan-')
+        self.fake = FakeGitHub(self.root, users=users, api_url=self.config.base_url)
+        self.logins = {RateLimitGovernor.mask(token): users[token] for token in users if isinstance(token, str)}
+
+    def start(self):
+        ConnectionHandler.use_transport(self.fake.get_transport(), RateLimitGovernor(Planner.UNLIMITED, Planner.UNLIMITED))
+
+    def stop(self):
+        ConnectionHandler.use_transport()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    # Estimates how long every PAT needs for its planned requests and the number of rate limit windows they span.
+    def get_plan(self, report):
+        per_minute = self.settings['content_creation_per_minute']
+        per_hour = self.settings['content_creation_per_hour']
+        parallel_requests = min(self.concurrency, self.settings['max_connections_per_host'])
+        tokens = {}
+        for token in report['tokens']:
+            stats = report['tokens'][token]
+            requests = stats['requests']
+            content_creations = stats['content_creations']
+            # The content creation buckets start full, so only the creations beyond their capacity wait for them to refill.
+            pacing = max(0, (content_creations - per_minute) * 60 / per_minute, (content_creations - per_hour) * 3600 / per_hour, (requests - Planner.REQUESTS_PER_HOUR) * 3600 / Planner.REQUESTS_PER_HOUR)
+            tokens[self.logins.get(token, token)] = {
+                'requests': requests,
+                'content_creations': content_creations,
+                'rate_limit_windows': max(1, math.ceil(requests / Planner.REQUESTS_PER_HOUR), math.ceil(content_creations / per_hour)) if requests > 0 else 0,
+                'estimated_seconds': round(max(pacing, requests * self.latency / min(parallel_requests, self.settings['max_connections_per_token'])), 1)
+            }
+        requests = sum(tokens[login]['requests'] for login in tokens)
+        estimated_seconds = max([requests * self.latency / parallel_requests] + [tokens[login]['estimated_seconds'] for login in tokens])
+        return {
+            'latency': self.latency,
+            'concurrency': self.concurrency,
+            'requests': requests,
+            'estimated_seconds': round(estimated_seconds, 1),
+            'endpoints': {f'{e["method"]} {e["endpoint"]}': e['requests'] for e in report['endpoints']},
+            'tokens': tokens,
+            'git_pushes': len([repo for repo in self.config.repo_names if repo in self.config.repo_names_mapping_to_public_repos])
+        }
+
+    def print_plan(plan):
+        print(f'Planned API requests: {plan["requests"]}')
+        for endpoint in plan['endpoints']:
+            print(f'{plan["endpoints"][endpoint]:>8}  {endpoint}')
+        print('Planned API requests per PAT:')
+        for login in plan['tokens']:
+            stats = plan['tokens'][login]
+            warning = '  <- exceeds the hourly limits' if stats['rate_limit_windows'] > 1 else ''
+            print(f'{stats["requests"]:>8}  {login} ({stats["content_creations"]} content creations, {stats["rate_limit_windows"]} rate limit windows, ~{stats["estimated_seconds"]} seconds){warning}')
+        print(f'Estimated duration with {plan["latency"]} seconds per request and {plan["concurrency"]} concurrent requests: {plan["estimated_seconds"]} seconds, '
+              f'not including cloning and pushing {plan["git_pushes"]} public repos')
@@ -1,4 +1,4 @@
-import os, pathlib, logging, subprocess, pygit2
+import os, pathlib, logging, subprocess, pygit2, json, hashlib, threading, heapq
 from datetime import datetime, timedelta
 from src.connection import ConnectionHandler
 from src.config import Config
@@ -7,81 +7,157 @@ from tqdm import tqdm
 class IdentityMap:
     
     PUBLIC_REPOS_PATH = 'public_repos'
+    CACHE_FILE = 'identity_map.json'
+    HISTORY_DAYS = 1800
+    # Author maps computed in this process by public repos path and config file.
+    __maps = {}
+    __maps_lock = threading.Lock()
+    # Author commit counts by mirror path, HEAD and history window.
+    __authors_counts = {}
     
-    def __init__(self, config_file = None):
-        self.config = Config() if config_file is None else Config(config_file)
-        self.conn = ConnectionHandler(config_file=config_file)
-        self.local_repos_path = os.path.join(pathlib.Path().resolve(),IdentityMap.PUBLIC_REPOS_PATH)
+    def __init__(self, config = None, workspace = None):
+        self.config = Config.load(config)
+        self.conn = ConnectionHandler(config=self.config)
+        workspace = pathlib.Path().resolve() if workspace is None else workspace
+        self.local_repos_path = os.path.join(workspace,IdentityMap.PUBLIC_REPOS_PATH)
         if not os.path.isdir(self.local_repos_path):
-            os.mkdir(self.local_repos_path)
+            os.makedirs(self.local_repos_path)
         os.environ['GIT_SSL_NO_VERIFY'] = "1"
         self.members_activity_config = self.get_members_activity_config()
         self.repos_map = self.config.repo_names_mapping_to_public_repos
-        self.earliest_commit = int((datetime.utcnow() - timedelta(1800)).timestamp())
+        self.earliest_commit = int((datetime.utcnow() - timedelta(IdentityMap.HISTORY_DAYS)).timestamp())
         self.max_mapped_contributors = 10
     
     def get_members_activity_config(self):
         map = {}
-        for member in self.config.members:
-            if 'days_since_last_commit' in member:
-                for setting in member['days_since_last_commit']:
-                    if setting['repo'] not in map:
-                        map[setting['repo']] = []
-                    map[setting['repo']].append({'email': member['email'], 'days_since_last_commit': setting['days']})
+        for repo in self.config.repo_activity:
+            map[repo] = [{'email': a['email'], 'days_since_last_commit': a['days']} for a in self.config.repo_activity[repo]]
         return map
     
+    # The map is computed at most once per run, and reused from the disk cache while the public repo HEAD and the config are unchanged.
     def map_authors(self):
+        key = (self.local_repos_path, os.path.abspath(self.config.filename))
+        with IdentityMap.__maps_lock:
+            if key not in IdentityMap.__maps:
+                IdentityMap.__maps[key] = self.__map_authors()
+            return IdentityMap.__maps[key]
+
+    def __map_authors(self):
         map = {}
+        cache = self.load_cache()
         for repo in tqdm(self.repos_map, desc='Map GitGoat authors to public repo authors'):
+            cache_key = self.get_cache_key(repo)
+            if cache_key is not None and repo in cache and cache[repo]['key'] == cache_key:
+                logging.debug(f'Reusing the cached authors map of {repo}.')
+                map[repo] = cache[repo]['authors']
+                continue
             map[repo] = {}
             members_metadata = self.get_members_from_public_repo(self.repos_map[repo]['org'], self.repos_map[repo]['repo'])
             for member in self.members_activity_config[repo]:
                 if len(members_metadata) > 0:
                     map[repo][members_metadata.pop(0)] = member['email']
+            if cache_key is not None:
+                cache[repo] = {'key': cache_key, 'authors': map[repo]}
+        self.save_cache(cache)
         return map
+
+    # The key changes whenever the public repo HEAD or the settings that affect the mapping change.
+    def get_cache_key(self, repo):
+        head = self.get_remote_head(self.repos_map[repo]['org'], self.repos_map[repo]['repo'])
+        if head is None:
+            return None
+        settings = {
+            'public_repo': f'{self.repos_map[repo]["org"]}/{self.repos_map[repo]["repo"]}',
+            'head': head,
+            'emails': [member['email'] for member in self.members_activity_config[repo]],
+            'max_mapped_contributors': self.max_mapped_contributors,
+            'history_days': IdentityMap.HISTORY_DAYS
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_remote_head(self, organization, repository):
+        remote = self.config.get_public_repo_url(organization, repository)
+        result = subprocess.run(['git', 'ls-remote', remote, 'HEAD'], capture_output=True, text=True)
+        if result.returncode != 0 or len(result.stdout.split()) == 0:
+            logging.debug(f'Could not resolve the HEAD of {organization}/{repository}. Error: {result.stderr}')
+            return None
+        return result.stdout.split()[0]
+
+    def load_cache(self):
+        try:
+            with open(os.path.join(self.local_repos_path, IdentityMap.CACHE_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self, cache):
+        with open(os.path.join(self.local_repos_path, IdentityMap.CACHE_FILE), 'w') as f:
+            json.dump(cache, f, indent=2)
     
     def get_members_from_public_repo(self, organization, repository):
-        members_metadata = {}
         repo = self.clone_public_repo(organization, repository)
-        last = repo[repo.head.target]
-        for commit in repo.walk(last.id, pygit2.GIT_SORT_TIME):
-            if self.earliest_commit > commit.commit_time:
+        key = (repo.path, str(repo.head.target), self.earliest_commit // 86400)
+        if key not in IdentityMap.__authors_counts:
+            IdentityMap.__authors_counts[key] = IdentityMap.count_authors(repo.path, self.earliest_commit)
+        return self.get_top_contributors(IdentityMap.__authors_counts[key])
+
+    # Counts the non-merge commits per author email since earliest_commit, newest first, with a single streamed git log.
+    def count_authors(repo_path, earliest_commit):
+        if not os.path.exists(os.path.join(repo_path, 'shallow')):
+            subprocess.run(['git', '-C', repo_path, 'commit-graph', 'write', '--reachable'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        members_metadata = {}
+        try:
+            with subprocess.Popen(['git', '-C', repo_path, 'log', '--no-merges', f'--since=@{earliest_commit}', '--format=%ae', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors='replace') as git_log:
+                for line in git_log.stdout:
+                    email = line.rstrip('\n')
+                    if '[bot]' not in email:
+                        members_metadata[email] = members_metadata.get(email, 0) + 1
+            if git_log.returncode == 0:
+                return members_metadata
+        except OSError as ex:
+            logging.debug(f'Could not run git log on {repo_path}. Walking the commits with pygit2. Exception: {ex}')
+        return IdentityMap.walk_authors(pygit2.Repository(repo_path), earliest_commit)
+
+    def walk_authors(repo, earliest_commit):
+        members_metadata = {}
+        for commit in repo.walk(repo.head.target, pygit2.GIT_SORT_TIME):
+            if earliest_commit > commit.commit_time:
                 break
             if len(commit.parent_ids) > 1: # Merge commits
                 continue
             if commit.author is not None and commit.author.email is not None and '[bot]' not in commit.author.email:
-                if commit.author.email not in members_metadata:
-                    members_metadata[commit.author.email] = 0
-                members_metadata[commit.author.email] += 1
-        return self.get_top_contributors(members_metadata)
+                members_metadata[commit.author.email] = members_metadata.get(commit.author.email, 0) + 1
+        return members_metadata
 
+    # Ties keep the order in which the authors were first seen.
     def get_top_contributors(self, members_metadata):
-        top_contributors = []
-        members = members_metadata.copy()
-        for _ in range(self.max_mapped_contributors):
-            if len(members) > 0:
-                top_contributor = max(members, key=members.get)
-                top_contributors.append(top_contributor)
-                members[top_contributor] = 0
-        return top_contributors
+        return [email for email, _ in heapq.nlargest(self.max_mapped_contributors, members_metadata.items(), key=lambda member: member[1])]
 
+    # Only commit metadata within the mapped history window is needed, so the mirror is bare, blobless and shallow.
     def clone_public_repo(self, organization, repository):
-        remote = f'https://github.com/{organization}/{repository}.git'
-        os_path = os.path.join(self.local_repos_path, f'{organization}-{repository}')
+        remote = self.config.get_public_repo_url(organization, repository)
+        os_path = self.get_mirror_path(organization, repository)
+        shallow_since = f'--shallow-since={datetime.utcfromtimestamp(self.earliest_commit).strftime("%Y-%m-%d")}'
         if os.path.isdir(os_path):
-            logging.debug(f'A local copy of the repository {organization}/{repository} exists. Pulling recent changes.')
-            subprocess.run(['git', '-C', os_path, 'pull'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)  
+            logging.debug(f'A local mirror of the repository {organization}/{repository} exists. Fetching recent changes.')
+            branch = pygit2.Repository(os_path).head.shorthand
+            subprocess.run(['git', '-C', os_path, 'fetch', '--filter=blob:none', shallow_since, 'origin', f'+refs/heads/{branch}:refs/heads/{branch}'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         else:
             logging.debug(f'This is the fist time the repository {organization}/{repository} is cloned, so it may take less time going forward.')
-            subprocess.run(['git', 'clone', remote, os_path], stderr=subprocess.DEVNULL)   
+            result = subprocess.run(['git', 'clone', '--bare', '--filter=blob:none', shallow_since, remote, os_path], stderr=subprocess.DEVNULL)
+            if result.returncode != 0:
+                logging.debug(f'Partial clone of {organization}/{repository} failed. Falling back to a full clone.')
+                subprocess.run(['git', 'clone', '--bare', remote, os_path], stderr=subprocess.DEVNULL)
         return pygit2.Repository(os_path)
-    
+
+    def get_mirror_path(self, organization, repository):
+        return os.path.join(self.local_repos_path, f'{organization}-{repository}.git')
+
     def get_mapped_cloned_repo(self, gitgoat_repo_name):
         if gitgoat_repo_name in self.repos_map:
             org = self.config.repo_names_mapping_to_public_repos[gitgoat_repo_name]['org']
             repo = self.config.repo_names_mapping_to_public_repos[gitgoat_repo_name]['repo']
-            os_path = os.path.join(self.local_repos_path, f'{org}-{repo}')
-            return pygit2.Repository(os_path)
+            return pygit2.Repository(self.get_mirror_path(org, repo))
         return None
         
 
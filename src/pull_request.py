@@ -1,29 +1,32 @@
+from src.config import Config
 from src.connection import ConnectionHandler
+from src.inventory import Inventory
 from faker import Faker
-import time, logging
+import time, logging, asyncio
 
 class PullRequest:
 
-    def __init__(self, organization, config_file = None):
+    MERGE_ATTEMPTS = 3
+
+    def __init__(self, organization, config = None):
         self.endpoint = f'/repos/{organization}/[REPO]/pulls'
         self.fake = Faker()
-        self.config_file = config_file
+        self.config = Config.load(config)
+        self.connections = {}
+        self.inventory = Inventory.load(organization, self.config)
+        self.merge_locks = {}
 
-    async def get_pull_requests(self, pat, repository):
-        conn = ConnectionHandler(pat, self.config_file)
-        endpoint = self.endpoint.replace('[REPO]', repository)
-        pr_ids = {}
-        resp = await conn.get(endpoint)
-        if 'message' in resp:
-            logging.error(f'No PRs found in {endpoint}. Skipping.')
-            return pr_ids
-        for pr in resp:
-            if pr['state'] == 'open': 
-                pr_ids[str(pr['number'])] = pr['user']['login']
-        return pr_ids
+    def get_connection(self, pat = None):
+        if pat not in self.connections:
+            self.connections[pat] = ConnectionHandler(pat, self.config)
+        return self.connections[pat]
+
+    # The open pull requests come from the organization inventory, which also records the pull requests GitGoat opens, reviews and merges.
+    async def get_pull_requests(self, repository):
+        return await self.inventory.get_pull_requests(repository)
 
     async def create_pull_request(self, pat, repository, head_branch):
-        conn = ConnectionHandler(pat, self.config_file)
+        conn = self.get_connection(pat)
         endpoint = self.endpoint.replace('[REPO]', repository)
         data = {
             'head': head_branch,
@@ -32,24 +35,48 @@ class PullRequest:
             'body': self.fake.paragraph(nb_sentences=3)
         }
         resp = await conn.post(endpoint, json_data=data)
+        if 'number' in resp:
+            mergeable = {True: 'MERGEABLE', False: 'CONFLICTING'}.get(resp.get('mergeable'), 'UNKNOWN')
+            self.inventory.add_pull_request(repository, resp['number'], resp['user']['login'], head_branch, mergeable=mergeable)
         return resp
       
+    # Returns True if the pull request was approved.
     async def review(self, pat, repository, pull_request_number):
-        conn = ConnectionHandler(pat, self.config_file)
+        conn = self.get_connection(pat)
         endpoint = self.endpoint.replace('[REPO]', repository) + f'/{str(pull_request_number)}/reviews'
         data = {
             'event': 'APPROVE',
             'body:': self.fake.lexify(text='GitGoat automated PR review ????????')
         }
         resp = await conn.post(endpoint, data)
-        return resp
+        if resp.get('state') != 'APPROVED':
+            return False
+        self.inventory.set_pull_request_review(repository, pull_request_number, 'APPROVED')
+        return True
 
     async def merge(self, pat, repository, pull_request_number):
-        conn = ConnectionHandler(pat, self.config_file)
+        conn = self.get_connection(pat)
         endpoint = self.endpoint.replace('[REPO]', repository) + f'/{str(pull_request_number)}/merge'
         data = {
             'commit_title': self.fake.lexify(text='GitGoat fake commit title ????????'),
             'merge_method': 'merge'
         }
-        resp = await conn.put(endpoint, data)
-        return True if 'merged' in resp else False
\ No newline at end of file
+        # Pull requests are always opened against main. Merges to the same base branch run one at a time, since each one moves its head.
+        async with self.get_merge_lock(repository, 'main'):
+            for attempt in range(PullRequest.MERGE_ATTEMPTS):
+                resp = await conn.put(endpoint, data)
+                if resp.get('merged'):
+                    self.inventory.set_branch_head(repository, 'main', resp['sha'])
+                    self.inventory.remove_pull_request(repository, pull_request_number)
+                    return True
+                # GitHub rejects the merge when the head or base branch moved since the merge commit was prepared.
+                if 'was modified' not in str(resp.get('message')):
+                    break
+                logging.info(f'The branches of the PR id {pull_request_number} in repository {repository} were modified. Retrying the merge.')
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+    def get_merge_lock(self, repository, base_branch):
+        if (repository, base_branch) not in self.merge_locks:
+            self.merge_locks[(repository, base_branch)] = asyncio.Lock()
+        return self.merge_locks[(repository, base_branch)]
\ No newline at end of file
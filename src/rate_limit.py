@@ -0,0 +1,99 @@
+import asyncio, logging, time
+
+class TokenBucket:
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, count = 1):
+        count = min(count, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= count:
+                self.tokens -= count
+                return
+            await asyncio.sleep((count - self.tokens) / self.rate)
+
+class RateLimitGovernor:
+
+    # GitHub asks to wait at least a minute after a secondary rate limit response without a Retry-After header.
+    SECONDARY_LIMIT_BACKOFF = 60
+
+    def __init__(self, content_creation_per_minute = 80, content_creation_per_hour = 500):
+        self.content_creation_per_minute = content_creation_per_minute
+        self.content_creation_per_hour = content_creation_per_hour
+        self.__states = {}
+
+    # Waits (without blocking the event loop) until the token is allowed to send another request.
+    # A request that creates several pieces of content (e.g. a batched mutation) passes their number as the weight.
+    # The content creation and secondary limits are shared by all the requests of a PAT, while the primary limits are
+    # counted per resource (e.g. core for REST and graphql), as in the X-RateLimit-Resource header.
+    async def acquire(self, token, write = False, weight = 1, resource = 'core'):
+        state = self.__get_state(token)
+        limit = self.__get_resource(state, resource)
+        while True:
+            now = time.time()
+            if limit['remaining'] is not None and now >= limit['reset']:
+                limit['remaining'] = None
+            time_to_sleep = state['blocked_until'] - now
+            if limit['remaining'] is not None and limit['remaining'] <= 0:
+                time_to_sleep = max(time_to_sleep, limit['reset'] - now + 1)
+            if time_to_sleep <= 0:
+                break
+            logging.info(f'Throttling {RateLimitGovernor.mask(token)}: waiting for {int(time_to_sleep)} seconds')
+            await asyncio.sleep(time_to_sleep)
+        # Taken before the next await, so concurrent requests of the PAT cannot all pass the check above.
+        if limit['remaining'] is not None:
+            limit['remaining'] -= 1
+        if write:
+            await state['per_minute'].acquire(weight)
+            await state['per_hour'].acquire(weight)
+
+    # Records the rate limit headers of a response. Returns True if the request was rejected by a rate limit and should be retried.
+    def update(self, token, resp, resource = 'core'):
+        state = self.__get_state(token)
+        limit = self.__get_resource(state, resp.headers.get('X-RateLimit-Resource', resource))
+        now = time.time()
+        if 'X-RateLimit-Remaining' in resp.headers and 'X-RateLimit-Reset' in resp.headers:
+            limit['remaining'] = int(resp.headers['X-RateLimit-Remaining'])
+            limit['reset'] = int(resp.headers['X-RateLimit-Reset'])
+        if resp.status_code not in [403, 429]:
+            return False
+        retry_after = int(resp.headers['Retry-After']) if 'Retry-After' in resp.headers else 0
+        if retry_after > 0:
+            logging.info(f'Secondary Throttling: {RateLimitGovernor.mask(token)} is paused for {retry_after} seconds')
+            state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+            return True
+        if limit['remaining'] == 0:
+            logging.info(f'Primary Throttling: {RateLimitGovernor.mask(token)} is paused until {int(limit["reset"] - now) + 1} seconds from now')
+            return True
+        if 'secondary rate limit' in resp.text.lower():
+            logging.info(f'Secondary Throttling: {RateLimitGovernor.mask(token)} is paused for {RateLimitGovernor.SECONDARY_LIMIT_BACKOFF} seconds')
+            state['blocked_until'] = max(state['blocked_until'], now + RateLimitGovernor.SECONDARY_LIMIT_BACKOFF)
+            return True
+        return False
+
+    def __get_state(self, token):
+        if token not in self.__states:
+            self.__states[token] = {
+                'resources': {},
+                'blocked_until': 0,
+                'per_minute': TokenBucket(self.content_creation_per_minute, 60),
+                'per_hour': TokenBucket(self.content_creation_per_hour, 3600)
+            }
+        return self.__states[token]
+
+    def __get_resource(self, state, resource):
+        if resource not in state['resources']:
+            state['resources'][resource] = {'remaining': None, 'reset': 0}
+        return state['resources'][resource]
+
+    def mask(token):
+        if token is None:
+            return 'anonymous'
+        return '***' + token[-4:] if len(token) > 8 else '***'
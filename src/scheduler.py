@@ -0,0 +1,111 @@
+import asyncio, logging, time
+from tqdm import tqdm
+from src.telemetry import Telemetry
+
+class Scheduler:
+
+    def __init__(self, name = 'GitGoat', position = 0):
+        self.name = name
+        self.position = position
+        self.tasks = {}
+
+    # Registers a task. The function is called without arguments and must return an awaitable.
+    # Tasks that only build in-memory state for other tasks are not journaled, so they run again when a run is resumed.
+    def add(self, task_name, func, dependencies = [], journaled = True):
+        if task_name in self.tasks:
+            raise ValueError(f'The task {task_name} is already scheduled')
+        self.tasks[task_name] = {
+            'func': func,
+            'dependencies': list(dict.fromkeys(dependencies)),
+            'journaled': journaled,
+            'start': None,
+            'end': None
+        }
+        return task_name
+
+    # Runs every task as soon as its dependencies are done, with up to max_concurrency tasks in flight.
+    # A semaphore can be given instead to share the concurrency cap between several schedulers.
+    # With a journal, the tasks it lists as completed are skipped and every newly completed task is recorded in it.
+    async def run(self, max_concurrency = 10, semaphore = None, journal = None):
+        order = self.__topological_order()
+        semaphore = asyncio.Semaphore(max_concurrency) if semaphore is None else semaphore
+        futures = {}
+        failures = {}
+        progress = tqdm(total=len(order), desc=self.name, position=self.position)
+        started = time.monotonic()
+
+        async def execute(task_name):
+            task = self.tasks[task_name]
+            for dependency in task['dependencies']:
+                try:
+                    await futures[dependency]
+                except Exception:
+                    failures[task_name] = f'Skipped since {dependency} failed'
+                    progress.update(1)
+                    raise
+            if journal is not None and task['journaled'] and journal.is_completed(task_name):
+                progress.update(1)
+                return
+            async with semaphore:
+                task['start'] = time.monotonic()
+                try:
+                    await task['func']()
+                except Exception as ex:
+                    logging.error(f'The task {task_name} failed. Exception: {ex}')
+                    failures[task_name] = ex
+                    raise
+                else:
+                    if journal is not None and task['journaled']:
+                        journal.record(task_name)
+                finally:
+                    task['end'] = time.monotonic()
+                    Telemetry.get().record_task(task_name, task['start'], task['end'], task_name in failures)
+                    progress.update(1)
+
+        for task_name in order:
+            futures[task_name] = asyncio.ensure_future(execute(task_name))
+        await asyncio.gather(*futures.values(), return_exceptions=True)
+        progress.close()
+        self.report(time.monotonic() - started)
+        if len(failures) > 0:
+            raise RuntimeError(f'{len(failures)} of {len(order)} tasks did not complete in {self.name}: {", ".join(failures)}')
+
+    # Logs the chain of tasks that determined the total run time.
+    def report(self, wall_time):
+        finished = [name for name in self.tasks if self.tasks[name]['end'] is not None]
+        if len(finished) == 0:
+            return
+        path = []
+        current = max(finished, key=lambda name: self.tasks[name]['end'])
+        while current is not None:
+            path.append(current)
+            dependencies = [d for d in self.tasks[current]['dependencies'] if self.tasks[d]['end'] is not None]
+            current = max(dependencies, key=lambda name: self.tasks[name]['end']) if len(dependencies) > 0 else None
+        path.reverse()
+        steps = ' -> '.join(f'{name} ({self.tasks[name]["end"] - self.tasks[name]["start"]:.1f}s)' for name in path)
+        path_time = sum(self.tasks[name]['end'] - self.tasks[name]['start'] for name in path)
+        logging.info(f'{self.name} finished in {wall_time:.1f}s. Critical path ({path_time:.1f}s): {steps}')
+
+    def __topological_order(self):
+        order = []
+        state = {}
+        for root in self.tasks:
+            stack = [(root, iter(self.tasks[root]['dependencies']))]
+            if root in state:
+                continue
+            state[root] = 'visiting'
+            while len(stack) > 0:
+                task_name, dependencies = stack[-1]
+                dependency = next(dependencies, None)
+                if dependency is None:
+                    stack.pop()
+                    state[task_name] = 'done'
+                    order.append(task_name)
+                elif dependency not in self.tasks:
+                    raise ValueError(f'The task {task_name} depends on the unknown task {dependency}')
+                elif state.get(dependency) == 'visiting':
+                    raise ValueError(f'Circular dependency between {task_name} and {dependency}')
+                elif dependency not in state:
+                    state[dependency] = 'visiting'
+                    stack.append((dependency, iter(self.tasks[dependency]['dependencies'])))
+        return order
@@ -1,25 +1,33 @@
-import os, pathlib, base64
+import os, pathlib, base64, random
 
 class Secrets:
-    
-    def __init__(self):
-        self.path = os.path.join(pathlib.Path().resolve(),'secrets')
-        self.files = os.listdir(self.path)
-        self.retrieved_files = []
+
+    # The secret files are decoded once, in file name order. A seed draws the secrets at random (reproducibly) instead of round robin.
+    def __init__(self, path = None, seed = None):
+        self.path = os.path.join(pathlib.Path().resolve(),'secrets') if path is None else path
+        self.files = sorted(file for file in os.listdir(self.path) if file.endswith('.encoded'))
+        self.secrets = tuple(Secrets.__read_secret(os.path.join(self.path, file)) for file in self.files)
+        self.__next = 0
+        self.__random = random.Random(seed) if seed is not None else None
 
     def get_next_secret(self) -> str:
-        if len(self.files) == len(self.retrieved_files):
-            self.retrieved_files = []
-        for file in self.files:
-            if file not in self.retrieved_files:
-                self.retrieved_files.append(file)
-                if not file.endswith(".encoded"):
-                    continue
-                with open(os.path.join(self.path, file),'r') as f:
-                    content = f.read()
-                    return Secrets.__get_secret_from_file_content(file, content)
-    
-    def __get_secret_from_file_content(file_name: str, file_content: str) -> str:
+        if len(self.secrets) == 0:
+            return None
+        if self.__random is not None:
+            return self.secrets[self.__random.randrange(len(self.secrets))]
+        secret = self.secrets[self.__next]
+        self.__next = (self.__next + 1) % len(self.secrets)
+        return secret
+
+    # Hands out the given number of secrets at once, e.g. for all the files of a commit.
+    def get_secrets(self, count: int) -> list:
+        return [self.get_next_secret() for _ in range(count)]
+
+    def __read_secret(file_path: str) -> str:
+        with open(file_path, 'r') as f:
+            return Secrets.__get_secret_from_file_content(f.read())
+
+    def __get_secret_from_file_content(file_content: str) -> str:
         for _ in range(3):
             file_content = base64.b64decode(file_content)
-        return file_content.decode('utf-8')
\ No newline at end of file
+        return file_content.decode('utf-8')
@@ -0,0 +1,48 @@
+import os, time, random, shutil, subprocess, pygit2
+
+class SyntheticRepo:
+
+    # Creates a bare repo whose main branch has the given number of commits, written in a single git fast-import stream.
+    # The commits are authored round robin by the given emails over the last days. Every commit changes churn of the files,
+    # and a merge_rate fraction of them are merge commits of a short side branch forked a few commits back.
+    def create(path, authors, commits = 1000, days = 365, files = 100, churn = 3, merge_rate = 0, seed = 0):
+        shutil.rmtree(path, ignore_errors=True)
+        pygit2.init_repository(path, bare=True, initial_head='main')
+        rand = random.Random(seed)
+        now = int(time.time())
+        with subprocess.Popen(['git', '-C', path, 'fast-import', '--quiet', '--done'], stdin=subprocess.PIPE) as fast_import:
+            main_marks = []
+            mark = 0
+            count = 0
+            while count < commits:
+                timestamp = now - int(days * 86400 * (commits - count) / commits)
+                merge = merge_rate > 0 and len(main_marks) > 2 and count + 1 < commits and rand.random() < merge_rate
+                if merge:
+                    mark += 1
+                    fork = main_marks[-rand.randint(2, min(10, len(main_marks)))]
+                    fast_import.stdin.write(SyntheticRepo.get_commit(mark, 'refs/heads/side', authors[count % len(authors)], timestamp, f'Side commit {count}', [fork], SyntheticRepo.get_changes(rand, files, churn, count)))
+                    count += 1
+                    side_mark = mark
+                mark += 1
+                parents = main_marks[-1:] + ([side_mark] if merge else [])
+                fast_import.stdin.write(SyntheticRepo.get_commit(mark, 'refs/heads/main', authors[count % len(authors)], timestamp, f'Commit {count}', parents, [] if merge else SyntheticRepo.get_changes(rand, files, churn, count)))
+                main_marks.append(mark)
+                count += 1
+            fast_import.stdin.write(b'done\n')
+        subprocess.run(['git', '-C', path, 'update-ref', '-d', 'refs/heads/side'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return pygit2.Repository(path)
+
+    def get_commit(mark, ref, email, timestamp, message, parents, changes):
+        signature = f'{email.split("@")[0]} <{email}> {timestamp} +0000'
+        lines = [f'commit {ref}', f'mark :{mark}', f'author {signature}', f'committer {signature}', f'data {len(message)}', message]
+        if len(parents) > 0:
+            lines.append(f'from :{parents[0]}')
+        lines.extend(f'merge :{parent}' for parent in parents[1:])
+        return ('\n'.join(lines) + '\n').encode('utf-8') + b''.join(changes) + b'\n'
+
+    def get_changes(rand, files, churn, count):
+        changes = []
+        for file in rand.sample(range(files), min(churn, files)):
+            content = f'{count} {rand.random()}\n'.encode('utf-8')
+            changes.append(f'M 100644 inline src/dir_{file % 10}/file_{file}.txt\ndata {len(content)}\n'.encode('utf-8') + content)
+        return changes
@@ -1,12 +1,44 @@
 
+import asyncio
+from src.config import Config
 from src.connection import ConnectionHandler
 
 class Team:
 
-    def __init__(self, organization, config_file = None):
+    # The role names GitHub reports for the permissions of the config file.
+    ROLE_NAMES = {
+        'pull': 'read',
+        'triage': 'triage',
+        'push': 'write',
+        'maintain': 'maintain',
+        'admin': 'admin'
+    }
+    # The REST API lists the members of the child teams as members of a team, so the direct members are read with GraphQL.
+    MEMBERS_QUERY = """
+        query ($org: String!, $team: String!, $cursor: String) {
+            organization(login: $org) {
+                team(slug: $team) {
+                    members(membership: IMMEDIATE, first: 100, after: $cursor) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            role
+                            node {
+                                login
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """
+
+    def __init__(self, organization, config = None):
         self.org = organization
         self.endpoint = f'/orgs/{organization}/teams'
-        self.conn = ConnectionHandler(config_file=config_file)
+        self.conn = ConnectionHandler(config=config)
 
     async def create(self, name, repo_names = [], parent_team = None):
         data = {
@@ -18,6 +50,80 @@ class Team:
             data['parent_team_id'] = parent_team
         resp = await self.conn.post(self.endpoint, json_data=data)
         return resp['slug'], resp['id']
+
+    # Creates a team under its (already created) parent and grants all its repo permissions in parallel.
+    async def provision(self, team, parent_team_id = None):
+        team_slug, team_id = await self.create(team['name'], team['repo_names'], parent_team_id)
+        await asyncio.gather(*[self.add_repository_permission(team_slug, f'{self.org}/{repo}', team['permissions'][repo]) for repo in team['permissions']])
+        return team_slug, team_id
+
+    # Brings an existing team to its definition: moves it under the right parent, grants only the missing repo permissions and removes the others.
+    async def reconcile(self, team, existing_team, parent_team_id = None):
+        team_slug = existing_team['slug']
+        if existing_team['parent_id'] != parent_team_id:
+            await self.conn.patch(f'{self.endpoint}/{team_slug}', json_data={'parent_team_id': parent_team_id})
+        current_permissions = await self.get_repository_permissions(team_slug)
+        permissions = {repo: team['permissions'][repo] for repo in team['permissions'] if current_permissions.get(repo) != Team.ROLE_NAMES.get(team['permissions'][repo])}
+        await asyncio.gather(*[self.add_repository_permission(team_slug, f'{self.org}/{repo}', permissions[repo]) for repo in permissions],
+                             *[self.remove_repository_permission(team_slug, f'{self.org}/{repo}') for repo in current_permissions if repo not in team['permissions']])
+        return team_slug, existing_team['id']
+
+    # Team name -> slug, id and parent id of the teams in the organization.
+    async def get_existing(self):
+        teams = {}
+        async for team in self.conn.get_paginated(self.endpoint):
+            teams[team['name']] = {
+                'slug': team['slug'],
+                'id': team['id'],
+                'parent_id': team['parent']['id'] if team.get('parent') is not None else None
+            }
+        return teams
+
+    # Repo name -> role name of the team in that repo.
+    async def get_repository_permissions(self, team_name):
+        return {repo['name']: repo.get('role_name') async for repo in self.conn.get_paginated(f'{self.endpoint}/{team_name}/repos')}
+
+    # Login -> role (MEMBER or MAINTAINER) of the direct members of the team.
+    async def get_direct_members(self, team_name):
+        members = {}
+        cursor = None
+        while True:
+            resp = await self.conn.post_graphql(Team.MEMBERS_QUERY, {'org': self.org, 'team': team_name, 'cursor': cursor}, Config.get_pat())
+            page = (((resp.get('data') or {}).get('organization') or {}).get('team') or {}).get('members')
+            if page is None:
+                raise RuntimeError(f'Could not read the members of the team {team_name}. Errors: {resp.get("errors")}')
+            for edge in page['edges']:
+                members[edge['node']['login']] = edge['role']
+            if not page['pageInfo']['hasNextPage']:
+                return members
+            cursor = page['pageInfo']['endCursor']
+
+    # The team tree of the config file, parents first. Each team lists its repo permissions, its parent and its members.
+    def get_definitions(config, org):
+        parents = {}
+        for parent_team in config.parent_teams:
+            for child in parent_team['children']:
+                parents[child] = parent_team['team']
+        teams = []
+        for parent_team in config.parent_teams:
+            teams.append({
+                'name': parent_team['team'],
+                'repo_names': [f'{org}/{repo}-{parent_team["repo_permissions"][repo]}' for repo in parent_team['repo_permissions']],
+                'permissions': dict(parent_team['repo_permissions']),
+                'parent': parents.get(parent_team['team']),
+                'members': list(config.group_members.get(parent_team['team'], ()))
+            })
+        for repo in config.teams:
+            for gp in repo['group_postfixes']:
+                name = f'{repo["repo"]}-{gp}'
+                teams.append({
+                    'name': name,
+                    'repo_names': [f'{org}/{repo["repo"]}'],
+                    'permissions': {repo['repo']: gp},
+                    'parent': parents.get(name),
+                    'members': list(config.group_members.get(name, ()))
+                })
+        return teams
     
     async def get(self, slug):
         resp = await self.conn.get(f'{self.endpoint}/{slug}')
@@ -31,6 +137,12 @@ class Team:
         resp = await self.conn.put(endpoint, data)
         return resp
 
+    async def add_members(self, team_name, members):
+        return await asyncio.gather(*[self.add_member(team_name, member) for member in members])
+
+    async def remove_members(self, team_name, members):
+        await asyncio.gather(*[self.conn.delete(f'/orgs/{self.org}/teams/{team_name}/memberships/{member}') for member in members])
+
     # Permission parameter options: pull, push, admin, maintain, triage
     async def add_repository_permission(self, team_name, repo_name, permission):
         endpoint = f'/orgs/{self.org}/teams/{team_name}/repos/{repo_name}'
@@ -39,8 +151,16 @@ class Team:
         }
         resp = await self.conn.put(endpoint, data)
         return resp
+
+    async def remove_repository_permission(self, team_name, repo_name):
+        await self.conn.delete(f'/orgs/{self.org}/teams/{team_name}/repos/{repo_name}')
+
+    # Deleting a team also deletes its child teams.
+    async def delete_teams(self, team_names):
+        await asyncio.gather(*[self.conn.delete(f'{self.endpoint}/{team_name}') for team_name in team_names])
         
     async def delete(self):
-        teams = await self.conn.get(f'/orgs/{self.org}/teams')
-        for team in teams:
-            await self.conn.delete(f'/orgs/{self.org}/teams/{team["slug"]}')
+        # The full list is read before deleting, otherwise the deletions shift the following pages.
+        teams = [team async for team in self.conn.get_paginated(self.endpoint)]
+        # Deleting a team also deletes its child teams, so only the top level teams are deleted.
+        await asyncio.gather(*[self.conn.delete(f'/orgs/{self.org}/teams/{team["slug"]}') for team in teams if team.get('parent') is None])
@@ -0,0 +1,174 @@
+import os, json, time, logging
+from datetime import datetime
+from src.rate_limit import RateLimitGovernor
+
+class Telemetry:
+
+    REPORTS_PATH = 'reports'
+    # Upper bounds (in seconds) of the request latency histogram buckets, as in the Prometheus client defaults.
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    # Path segments that are followed by identifiers, with the placeholders of the identifiers. A placeholder ending with * takes the rest of the path.
+    PATH_PARAMETERS = {
+        'orgs': ['{org}'],
+        'repos': ['{owner}', '{repo}'],
+        'teams': ['{team}'],
+        'memberships': ['{username}'],
+        'pulls': ['{number}'],
+        'invitations': ['{invitation_id}'],
+        'branches': ['{branch}'],
+        'heads': ['{ref*}'],
+        'contents': ['{path*}']
+    }
+    # A single telemetry per process, so every ConnectionHandler and Scheduler records to the same report.
+    __instance = None
+
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints = {}
+        self.tokens = {}
+        self.phases = {}
+
+    def get():
+        if Telemetry.__instance is None:
+            Telemetry.__instance = Telemetry()
+        return Telemetry.__instance
+
+    # Starts a new report, e.g. at the beginning of a run.
+    def reset():
+        Telemetry.__instance = Telemetry()
+        return Telemetry.__instance
+
+    # Replaces the identifiers in an API path with placeholders, e.g. /repos/{owner}/{repo}/pulls/{number}/merge.
+    def get_endpoint_template(path):
+        segments = path.split('?')[0].strip('/').split('/')
+        template = []
+        i = 0
+        while i < len(segments):
+            template.append(segments[i])
+            for placeholder in Telemetry.PATH_PARAMETERS.get(segments[i], []):
+                # e.g. /user/memberships/orgs/{org} has no username
+                if i + 1 >= len(segments) or segments[i + 1] in Telemetry.PATH_PARAMETERS:
+                    break
+                template.append(placeholder.replace('*', ''))
+                i = len(segments) - 1 if placeholder.endswith('*}') else i + 1
+            i += 1
+        return '/' + '/'.join(template)
+
+    # Content creations are the weight of a write request in the content creation rate limits (e.g. the commits of a batched mutation).
+    def record_request(self, method, endpoint, token, status_code, seconds, sent_bytes, received_bytes, content_creations = 0, retry = False):
+        for stats in self.__get_stats(method, endpoint, token):
+            stats['requests'] += 1
+            stats['content_creations'] += content_creations
+            stats['status'][str(status_code)] = stats['status'].get(str(status_code), 0) + 1
+            stats['retries'] += 1 if retry else 0
+            stats['sent_bytes'] += sent_bytes
+            stats['received_bytes'] += received_bytes
+            stats['latency']['sum'] += seconds
+            stats['latency']['count'] += 1
+            for i, bound in enumerate(Telemetry.LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats['latency']['buckets'][i] += 1
+
+    def record_rate_limit_wait(self, method, endpoint, token, seconds):
+        for stats in self.__get_stats(method, endpoint, token):
+            stats['rate_limit_wait_seconds'] += seconds
+
+    # Task names are prefixed with their phase, e.g. commits:miker-gg belongs to the commits phase.
+    def record_task(self, task_name, start, end, failed = False):
+        phase = task_name.split(':')[0]
+        if phase not in self.phases:
+            self.phases[phase] = {'tasks': 0, 'failures': 0, 'busy_seconds': 0, 'start': start, 'end': end}
+        stats = self.phases[phase]
+        stats['tasks'] += 1
+        stats['failures'] += 1 if failed else 0
+        stats['busy_seconds'] += end - start
+        stats['start'] = min(stats['start'], start)
+        stats['end'] = max(stats['end'], end)
+
+    def __get_stats(self, method, endpoint, token):
+        key = f'{method} {endpoint}'
+        masked_token = RateLimitGovernor.mask(token.split(' ')[-1] if token is not None else None)
+        if key not in self.endpoints:
+            self.endpoints[key] = {'method': method, 'endpoint': endpoint, **Telemetry.__new_stats()}
+        if masked_token not in self.tokens:
+            self.tokens[masked_token] = Telemetry.__new_stats()
+        return self.endpoints[key], self.tokens[masked_token]
+
+    def __new_stats():
+        return {
+            'requests': 0,
+            'content_creations': 0,
+            'status': {},
+            'retries': 0,
+            'sent_bytes': 0,
+            'received_bytes': 0,
+            'rate_limit_wait_seconds': 0,
+            'latency': {'buckets': [0] * len(Telemetry.LATENCY_BUCKETS), 'sum': 0, 'count': 0}
+        }
+
+    def get_report(self):
+        phases = {}
+        for phase in self.phases:
+            stats = self.phases[phase]
+            phases[phase] = {'tasks': stats['tasks'], 'failures': stats['failures'], 'busy_seconds': round(stats['busy_seconds'], 3), 'wall_seconds': round(stats['end'] - stats['start'], 3)}
+        return {
+            'started': datetime.utcfromtimestamp(self.started).isoformat(timespec='seconds') + 'Z',
+            'duration_seconds': round(time.time() - self.started, 3),
+            'latency_buckets': list(Telemetry.LATENCY_BUCKETS),
+            'phases': phases,
+            'endpoints': sorted(self.endpoints.values(), key=lambda stats: -stats['requests']),
+            'tokens': self.tokens
+        }
+
+    # The report in the Prometheus text exposition format.
+    def get_prometheus_metrics(self):
+        report = self.get_report()
+        lines = []
+        def add(name, metric_type, help_text, samples, suffix = ''):
+            lines.append(f'# HELP gitgoat_{name} {help_text}')
+            lines.append(f'# TYPE gitgoat_{name} {metric_type}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{Telemetry.escape_label(labels[key])}"' for key in labels)
+                lines.append(f'gitgoat_{name}{suffix}{{{label_text}}} {value}' if len(label_text) > 0 else f'gitgoat_{name}{suffix} {value}')
+        endpoints = report['endpoints']
+        tokens = report['tokens']
+        add('run_duration_seconds', 'gauge', 'Duration of the run.', [({}, report['duration_seconds'])])
+        add('phase_tasks_total', 'counter', 'Tasks run per phase.', [({'phase': phase}, report['phases'][phase]['tasks']) for phase in report['phases']])
+        add('phase_failures_total', 'counter', 'Failed tasks per phase.', [({'phase': phase}, report['phases'][phase]['failures']) for phase in report['phases']])
+        add('phase_busy_seconds', 'gauge', 'Sum of the task durations per phase.', [({'phase': phase}, report['phases'][phase]['busy_seconds']) for phase in report['phases']])
+        add('phase_wall_seconds', 'gauge', 'Time from the first task start to the last task end per phase.', [({'phase': phase}, report['phases'][phase]['wall_seconds']) for phase in report['phases']])
+        add('http_requests_total', 'counter', 'API requests per endpoint and status code.', [({'method': e['method'], 'endpoint': e['endpoint'], 'status': status}, e['status'][status]) for e in endpoints for status in e['status']])
+        add('http_retries_total', 'counter', 'Retried API requests per endpoint.', [({'method': e['method'], 'endpoint': e['endpoint']}, e['retries']) for e in endpoints])
+        add('http_sent_bytes_total', 'counter', 'Request body bytes per endpoint.', [({'method': e['method'], 'endpoint': e['endpoint']}, e['sent_bytes']) for e in endpoints])
+        add('http_received_bytes_total', 'counter', 'Response body bytes per endpoint.', [({'method': e['method'], 'endpoint': e['endpoint']}, e['received_bytes']) for e in endpoints])
+        add('http_rate_limit_wait_seconds_total', 'counter', 'Time spent waiting for the rate limits per endpoint.', [({'method': e['method'], 'endpoint': e['endpoint']}, round(e['rate_limit_wait_seconds'], 3)) for e in endpoints])
+        samples = []
+        for e in endpoints:
+            labels = {'method': e['method'], 'endpoint': e['endpoint']}
+            for bound, count in zip(Telemetry.LATENCY_BUCKETS, e['latency']['buckets']):
+                samples.append(({**labels, 'le': str(bound)}, count))
+            samples.append(({**labels, 'le': '+Inf'}, e['latency']['count']))
+        add('http_request_duration_seconds', 'histogram', 'API request latency per endpoint.', samples, '_bucket')
+        lines.extend(f'gitgoat_http_request_duration_seconds_sum{{method="{e["method"]}",endpoint="{Telemetry.escape_label(e["endpoint"])}"}} {round(e["latency"]["sum"], 6)}' for e in endpoints)
+        lines.extend(f'gitgoat_http_request_duration_seconds_count{{method="{e["method"]}",endpoint="{Telemetry.escape_label(e["endpoint"])}"}} {e["latency"]["count"]}' for e in endpoints)
+        add('token_requests_total', 'counter', 'API requests per PAT.', [({'token': token}, tokens[token]['requests']) for token in tokens])
+        add('token_content_creations_total', 'counter', 'Content created per PAT, as counted by the content creation rate limits.', [({'token': token}, tokens[token]['content_creations']) for token in tokens])
+        add('token_retries_total', 'counter', 'Retried API requests per PAT.', [({'token': token}, tokens[token]['retries']) for token in tokens])
+        add('token_rate_limit_wait_seconds_total', 'counter', 'Time spent waiting for the rate limits per PAT.', [({'token': token}, round(tokens[token]['rate_limit_wait_seconds'], 3)) for token in tokens])
+        return '\n'.join(lines) + '\n'
+
+    def escape_label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    # Writes the report as JSON and in the Prometheus text format, and returns the JSON file name.
+    def write_report(self, name, path = None):
+        path = Telemetry.REPORTS_PATH if path is None else path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        filename = os.path.join(path, f'{name}-{datetime.utcfromtimestamp(self.started).strftime("%Y%m%d-%H%M%S")}')
+        with open(filename + '.json', 'w') as f:
+            json.dump(self.get_report(), f, indent=2)
+        with open(filename + '.prom', 'w') as f:
+            f.write(self.get_prometheus_metrics())
+        logging.info(f'The run report was written to {filename}.json and {filename}.prom')
+        return filename + '.json'
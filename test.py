@@ -1,14 +1,17 @@
 import asyncio, logging, sys, os
 from src.config import Config
+from src.connection import ConnectionHandler
 from src.repository import Repository
 
 async def mock_test(config_file: str, orgs: list = []):
-    config = Config() if config_file is None else Config(config_file)
+    config = Config.load(config_file)
     org_names = orgs if len(orgs) > 0 else config.org_names
     for org in org_names:
         logging.info('----- Checking access to repos -----')
-        r = Repository(org)
-        if len(await r.get_all()) > 0:
+        r = Repository(org, config)
+        repos = await r.get_all()
+        await ConnectionHandler.close()
+        if len(repos) > 0:
             logging.info('Managed to get access to repos')
             exit(0)
         logging.error('Did NOT manage to get access to repos')